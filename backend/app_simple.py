@@ -6,7 +6,6 @@ Environmental sustainability platform backend
 import os
 import logging
 import requests
-import base64
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -16,6 +15,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from dotenv import load_dotenv
 import json
+from model_client import get_model_client, get_replica_pool, get_circuit_breaker, CircuitOpenError, ModelServerError
+from classification import format_classification
 
 # Load environment variables
 load_dotenv()
@@ -143,6 +144,8 @@ def health_check():
         'status': 'healthy',
         'message': 'EcoSage Backend API is running',
         'version': '1.0.0',
+        'model_servers': get_replica_pool().stats(),
+        'model_circuit': get_circuit_breaker().stats(),
         'timestamp': datetime.utcnow().isoformat()
     })
 
@@ -305,85 +308,45 @@ def classify_image():
         if file.filename == '':
             return jsonify({'success': False, 'error': 'No image selected'}), 400
         
-        # Read and encode image
+        # Read the upload once and forward the raw bytes (no base64/JSON wrapping)
         image_data = file.read()
-        image_b64 = base64.b64encode(image_data).decode('utf-8')
         
-        # Forward to model server
+        # Forward to model server over the shared keep-alive pool; while it is down
+        # the last known result for the same image is served instead
         try:
-            model_url = 'http://127.0.0.1:8080/predictions/waste_classifier'
-            payload = {'image': image_b64}
+            model_result, from_cache = get_model_client().predict(image_data)
             
-            response = requests.post(model_url, json=payload, timeout=30)
+            # Transform model response to match frontend expectations
+            result = format_classification(model_result)
+            prediction = model_result.get('prediction', 'unknown')
+            confidence = result['confidence']
             
-            if response.status_code == 200:
-                model_result = response.json()
-                
-                # Transform model response to match frontend expectations
-                prediction = model_result.get('prediction', 'unknown')
-                confidence = model_result.get('confidence', 0.0)
-                
-                # Map waste types to proper labels and impacts
-                waste_mapping = {
-                    'cardboard': {
-                        'label': 'Cardboard',
-                        'impact': 'Positive - Highly recyclable, biodegradable material',
-                        'suggestions': ['Recycle in paper/cardboard bin', 'Reuse for storage', 'Compost if clean']
-                    },
-                    'glass': {
-                        'label': 'Glass',
-                        'impact': 'Positive - 100% recyclable without quality loss',
-                        'suggestions': ['Recycle in glass container', 'Reuse jars and bottles', 'Return bottles for deposit']
-                    },
-                    'metal': {
-                        'label': 'Metal',
-                        'impact': 'Positive - Infinitely recyclable, high value material',
-                        'suggestions': ['Recycle in metal bin', 'Clean before recycling', 'Separate aluminum from steel']
-                    },
-                    'paper': {
-                        'label': 'Paper', 
-                        'impact': 'Neutral - Recyclable but degrades with each cycle',
-                        'suggestions': ['Recycle clean paper', 'Use both sides', 'Choose digital alternatives']
-                    },
-                    'plastic': {
-                        'label': 'Plastic',
-                        'impact': 'Negative - Can take 500+ years to decompose', 
-                        'suggestions': ['Check recycling number', 'Reduce plastic use', 'Choose reusable alternatives']
-                    },
-                    'trash': {
-                        'label': 'General Waste',
-                        'impact': 'Negative - Likely to end up in landfill or environment',
-                        'suggestions': ['Minimize waste production', 'Look for recyclable alternatives', 'Proper disposal']
-                    }
-                }
-                
-                waste_info = waste_mapping.get(prediction, {
-                    'label': prediction.title(),
-                    'impact': 'Unknown environmental impact',
-                    'suggestions': ['Consult local waste management guidelines']
-                })
-                
-                result = {
-                    'label': waste_info['label'],
-                    'confidence': float(confidence),
-                    'environmental_impact': waste_info['impact'],
-                    'suggestions': waste_info['suggestions']
-                }
-                
-                logger.info(f"Successfully classified image as: {prediction} ({confidence:.2f})")
-                
-                return jsonify({
-                    'success': True,
-                    'classification': result,
-                    'message': 'Image classified successfully using trained AI model'
-                })
-            else:
-                logger.error(f"Model server error: {response.status_code}")
-                return jsonify({
-                    'success': False, 
-                    'error': f'Model server responded with status {response.status_code}'
-                }), 500
+            logger.info(f"Successfully classified image as: {prediction} ({confidence:.2f})")
+            
+            return jsonify({
+                'success': True,
+                'classification': result,
+                'cached': from_cache,
+                'message': 'Model server unavailable, showing the last result for this image' if from_cache
+                           else 'Image classified successfully using trained AI model'
+            })
                 
+        except ModelServerError as e:
+            logger.error(f"Model server error: {e.status_code}")
+            return jsonify({
+                'success': False, 
+                'error': f'Model server responded with status {e.status_code}'
+            }), 500
+            
+        except CircuitOpenError as e:
+            logger.error("Model server circuit is open, failing fast")
+            response = jsonify({
+                'success': False,
+                'error': 'AI model server is temporarily unavailable. Please try again shortly.'
+            })
+            response.headers['Retry-After'] = str(max(1, int(e.retry_after)))
+            return response, 503
+            
         except requests.exceptions.ConnectionError:
             logger.error("Cannot connect to model server")
             return jsonify({
@@ -0,0 +1,67 @@
+"""
+Shared classification helpers for the EcoSage backend
+Turns a model server prediction into the label, environmental impact and
+suggestions the frontend displays. Used by app_simple.py and classify_gateway.py
+"""
+
+# Map waste types to proper labels and impacts
+WASTE_MAPPING = {
+    'cardboard': {
+        'label': 'Cardboard',
+        'impact': 'Positive - Highly recyclable, biodegradable material',
+        'suggestions': ['Recycle in paper/cardboard bin', 'Reuse for storage', 'Compost if clean']
+    },
+    'glass': {
+        'label': 'Glass',
+        'impact': 'Positive - 100% recyclable without quality loss',
+        'suggestions': ['Recycle in glass container', 'Reuse jars and bottles', 'Return bottles for deposit']
+    },
+    'metal': {
+        'label': 'Metal',
+        'impact': 'Positive - Infinitely recyclable, high value material',
+        'suggestions': ['Recycle in metal bin', 'Clean before recycling', 'Separate aluminum from steel']
+    },
+    'paper': {
+        'label': 'Paper', 
+        'impact': 'Neutral - Recyclable but degrades with each cycle',
+        'suggestions': ['Recycle clean paper', 'Use both sides', 'Choose digital alternatives']
+    },
+    'plastic': {
+        'label': 'Plastic',
+        'impact': 'Negative - Can take 500+ years to decompose', 
+        'suggestions': ['Check recycling number', 'Reduce plastic use', 'Choose reusable alternatives']
+    },
+    'trash': {
+        'label': 'General Waste',
+        'impact': 'Negative - Likely to end up in landfill or environment',
+        'suggestions': ['Minimize waste production', 'Look for recyclable alternatives', 'Proper disposal']
+    }
+}
+
+UNKNOWN_WASTE = {
+    'impact': 'Unknown environmental impact',
+    'suggestions': ['Consult local waste management guidelines']
+}
+
+
+def format_classification(model_result):
+    """
+    Transform a model server response to match frontend expectations
+    
+    Args:
+        model_result (dict): JSON body from /predictions/waste_classifier
+        
+    Returns:
+        dict: label, confidence, environmental_impact and suggestions
+    """
+    prediction = model_result.get('prediction', 'unknown')
+    confidence = model_result.get('confidence', 0.0)
+    
+    waste_info = WASTE_MAPPING.get(prediction, dict(UNKNOWN_WASTE, label=prediction.title()))
+    
+    return {
+        'label': waste_info['label'],
+        'confidence': float(confidence),
+        'environmental_impact': waste_info['impact'],
+        'suggestions': waste_info['suggestions']
+    }
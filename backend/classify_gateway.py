@@ -0,0 +1,312 @@
+"""
+EcoSage Classification Gateway - asyncio version of /api/classify
+Each waiting request is a coroutine rather than a Flask worker thread, so
+thousands can be in flight cheaply. Admission is bounded: at most
+GATEWAY_MAX_IN_FLIGHT requests talk to the model server, up to
+GATEWAY_MAX_QUEUE more wait their turn, and anything beyond that is shed
+with 429 + Retry-After. A slow model server can no longer tie up the
+threads serving events and trivia in app_simple.py
+
+Run next to the main backend and point the frontend's NEXT_PUBLIC_CLASSIFY_URL
+at http://localhost:5001/api/classify
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector, ClientConnectionError
+from dotenv import load_dotenv
+
+from classification import format_classification
+from model_client import (
+    PREDICT_PATH, RETRY_STATUSES, CircuitOpenError, ModelServerError,
+    get_replica_pool, get_circuit_breaker, get_last_known_results
+)
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AdmissionQueue:
+    def __init__(self, max_in_flight=64, max_queue=1000, queue_timeout=10.0):
+        """
+        Args:
+            max_in_flight (int): Requests allowed to call the model server at once
+            max_queue (int): Requests allowed to wait for a free slot
+            queue_timeout (float): Seconds a request may wait before it is shed
+        """
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = float(queue_timeout)
+
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def try_enter(self):
+        """Reserve a place in line, False when the gateway is already full"""
+        if self.in_flight + self.waiting >= self.max_in_flight + self.max_queue:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        return True
+
+    async def acquire(self):
+        """Wait for a model server slot, False if the queue timeout passes first"""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
+
+
+def overloaded_response(message):
+    retry_after = os.getenv('GATEWAY_RETRY_AFTER', '1')
+    return web.json_response({'success': False, 'error': message}, status=429, headers={'Retry-After': retry_after})
+
+
+async def call_model_server(session, replicas, image_bytes):
+    """
+    POST raw image bytes to the least loaded model server replica within one
+    overall deadline, retrying connection failures and 502/503/504 on the
+    next replica (or with backoff once every replica has been tried)
+
+    Returns:
+        tuple: (status code, parsed JSON body or None)
+    """
+    timeout = float(os.getenv('MODEL_CLIENT_TIMEOUT', '30'))
+    connect_timeout = float(os.getenv('MODEL_CLIENT_CONNECT_TIMEOUT', '1'))
+    retries = int(os.getenv('MODEL_CLIENT_RETRIES', '2'))
+    backoff = float(os.getenv('MODEL_CLIENT_BACKOFF', '0.1'))
+
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    tried = set()
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+
+        replica = replicas.acquire(tried)
+        tried.add(replica.url)
+        delay = backoff * (2 ** attempt)
+        ok = False
+        try:
+            async with session.post(
+                replica.url + PREDICT_PATH, data=image_bytes,
+                headers={'Content-Type': 'application/octet-stream'},
+                timeout=ClientTimeout(total=remaining, sock_connect=min(connect_timeout, remaining))
+            ) as response:
+                ok = response.status not in RETRY_STATUSES
+                if ok or attempt >= retries:
+                    body = await response.json() if response.status == 200 else None
+                    return response.status, body
+                if response.headers.get('Retry-After', '').isdigit():
+                    delay = max(delay, float(response.headers['Retry-After']))
+                logger.warning(f"Model server {replica.url} returned {response.status}, retrying")
+        except ClientConnectionError as e:
+            # Connect timeouts are retried; a timeout that used up the deadline is not
+            if attempt >= retries or time.monotonic() >= deadline:
+                raise
+            logger.warning(f"Model server {replica.url} connection failed ({e.__class__.__name__}), retrying")
+        finally:
+            replicas.release(replica, ok)
+
+        # Move straight on when another healthy replica has not been tried yet
+        if replicas.has_untried(tried):
+            delay = 0.0
+        if time.monotonic() + delay >= deadline:
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def predict(app, image_bytes):
+    """
+    Classify through the circuit breaker, falling back to the last known result
+
+    Returns:
+        tuple: (model server result dict, True if it came from the fallback cache)
+    """
+    breaker, results = app['breaker'], app['results']
+    try:
+        breaker.allow()
+        ok = False
+        try:
+            status, model_result = await call_model_server(app['session'], app['replicas'], image_bytes)
+            ok = status not in RETRY_STATUSES
+        finally:
+            breaker.record(ok)
+        if status == 200:
+            if results:
+                results.put(image_bytes, model_result)
+            return model_result, False
+        error = ModelServerError(status)
+    except (CircuitOpenError, ClientConnectionError, asyncio.TimeoutError) as e:
+        error = e
+
+    cached = results.get(image_bytes) if results else None
+    if cached is not None:
+        logger.warning(f"Serving last known result ({error.__class__.__name__})")
+        return cached, True
+    raise error
+
+
+async def classify_image(request):
+    """Classify uploaded image using trained AI model"""
+    admission = request.app['admission']
+
+    # Shed load before reading the upload so rejected requests cost almost nothing
+    if not admission.try_enter():
+        return overloaded_response('Classification service is busy, please retry shortly')
+    if not await admission.acquire():
+        return overloaded_response('Timed out waiting for the classification service')
+
+    try:
+        form = await request.post()
+        file = form.get('image')
+        if file is None or not hasattr(file, 'file'):
+            return web.json_response({'success': False, 'error': 'No image file provided'}, status=400)
+        if not file.filename:
+            return web.json_response({'success': False, 'error': 'No image selected'}, status=400)
+        image_data = file.file.read()
+
+        try:
+            model_result, from_cache = await predict(request.app, image_data)
+        except CircuitOpenError as e:
+            logger.error("Model server circuit is open, failing fast")
+            return web.json_response({
+                'success': False,
+                'error': 'AI model server is temporarily unavailable. Please try again shortly.'
+            }, status=503, headers={'Retry-After': str(max(1, int(e.retry_after)))})
+        except asyncio.TimeoutError:
+            # Checked first: aiohttp's timeout errors are also connection errors
+            logger.error("Model server timeout")
+            return web.json_response({'success': False, 'error': 'Model server request timed out'}, status=504)
+        except ClientConnectionError:
+            logger.error("Cannot connect to model server")
+            return web.json_response({
+                'success': False,
+                'error': 'AI model server is not available. Please ensure the model server is running on port 8080.'
+            }, status=503)
+        except ModelServerError as e:
+            logger.error(f"Model server error: {e.status_code}")
+            return web.json_response({
+                'success': False,
+                'error': f'Model server responded with status {e.status_code}'
+            }, status=500)
+
+        result = format_classification(model_result)
+        logger.info(f"Successfully classified image as: {model_result.get('prediction', 'unknown')} ({result['confidence']:.2f})")
+        return web.json_response({
+            'success': True,
+            'classification': result,
+            'cached': from_cache,
+            'message': 'Model server unavailable, showing the last result for this image' if from_cache
+                       else 'Image classified successfully using trained AI model'
+        })
+
+    except web.HTTPException:
+        # e.g. 413 from request.post() when the upload exceeds client_max_size
+        raise
+    except Exception as e:
+        logger.error(f"Error classifying image: {e}")
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+    finally:
+        admission.release()
+
+
+async def health_check(request):
+    """Health check endpoint with admission queue counters"""
+    return web.json_response({
+        'status': 'healthy',
+        'message': 'EcoSage Classification Gateway is running',
+        'model_servers': request.app['replicas'].stats(),
+        'model_circuit': request.app['breaker'].stats(),
+        'admission': request.app['admission'].stats()
+    })
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    origins = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000').split(',')
+    origin = request.headers.get('Origin')
+
+    if request.method == 'OPTIONS':
+        response = web.Response()
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get('Access-Control-Request-Headers', '*')
+    else:
+        response = await handler(request)
+
+    if origin in origins:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers['Vary'] = 'Origin'
+    return response
+
+
+async def model_server_session(app):
+    # One keep-alive pool sized to the admission limit, so in-flight requests never
+    # wait on connections and the gateway never opens more than that many sockets
+    connector = TCPConnector(limit=app['admission'].max_in_flight, keepalive_timeout=30)
+    app['session'] = ClientSession(connector=connector)
+    yield
+    await app['session'].close()
+
+
+def create_app():
+    app = web.Application(
+        middlewares=[cors_middleware],
+        client_max_size=16 * 1024 * 1024  # 16MB max file size, same as the Flask backend
+    )
+    app['admission'] = AdmissionQueue(
+        max_in_flight=int(os.getenv('GATEWAY_MAX_IN_FLIGHT', '64')),
+        max_queue=int(os.getenv('GATEWAY_MAX_QUEUE', '1000')),
+        queue_timeout=float(os.getenv('GATEWAY_QUEUE_TIMEOUT', '10'))
+    )
+    app['replicas'] = get_replica_pool()
+    app['breaker'] = get_circuit_breaker()
+    app['results'] = get_last_known_results()
+    app.cleanup_ctx.append(model_server_session)
+    app.router.add_get('/', health_check)
+    app.router.add_post('/api/classify', classify_image)
+    return app
+
+
+if __name__ == '__main__':
+    port = int(os.getenv('GATEWAY_PORT', 5001))
+
+    logger.info(f"🚀 Starting EcoSage Classification Gateway on port {port}")
+
+    web.run_app(create_app(), host='0.0.0.0', port=port)
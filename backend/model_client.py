@@ -0,0 +1,533 @@
+"""
+Pooled HTTP client for the EcoSage model server
+One keep-alive connection pool is shared by every request thread, each call
+has an overall deadline, and only failures that are safe to repeat
+(connection errors and 502/503/504 responses) are retried with backoff.
+With several model servers in MODEL_SERVER_URLS, calls go to the replica
+with the fewest requests in flight, skipping replicas whose /health reports
+no loaded model and replicas ejected after repeated failures. A circuit
+breaker fails calls fast while every replica is failing, and the last good
+result for each image (by content hash) is served when the model server is
+unreachable
+"""
+
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PREDICT_PATH = '/predictions/waste_classifier'
+RETRY_STATUSES = (502, 503, 504)
+
+
+def model_server_base_url():
+    """
+    MODEL_SERVER_URL (e.g. http://127.0.0.1:8080), falling back to the
+    older TORCHSERVE_URL prediction endpoint with its path stripped
+    """
+    url = os.getenv('MODEL_SERVER_URL')
+    if not url:
+        url = os.getenv('TORCHSERVE_URL', 'http://127.0.0.1:8080')
+        if url.endswith(PREDICT_PATH):
+            url = url[:-len(PREDICT_PATH)]
+    return url.rstrip('/')
+
+
+def model_server_urls():
+    """MODEL_SERVER_URLS (comma-separated replicas), or the single model server URL"""
+    urls = [url.strip().rstrip('/') for url in os.getenv('MODEL_SERVER_URLS', '').split(',') if url.strip()]
+    return urls or [model_server_base_url()]
+
+
+class Replica:
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now):
+        return self.healthy and now >= self.ejected_until
+
+    def stats(self, now):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected_for": round(max(0.0, self.ejected_until - now), 1),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class ReplicaPool:
+    def __init__(self, urls, eject_after=3, eject_seconds=15.0, health_interval=5.0):
+        """
+        Least-outstanding-requests routing over model server replicas
+
+        Args:
+            urls (list): Model server root URLs
+            eject_after (int): Consecutive failed calls before a replica is ejected
+            eject_seconds (float): How long an ejected replica gets no traffic
+            health_interval (float): Seconds between /health checks, 0 disables them
+        """
+        self.replicas = [Replica(url) for url in urls]
+        self.eject_after = max(1, int(eject_after))
+        self.eject_seconds = float(eject_seconds)
+        self.health_interval = float(health_interval)
+        self._lock = threading.Lock()
+        self._checker = None
+
+    def acquire(self, tried=()):
+        """
+        Pick the available replica with the fewest requests in flight and count
+        one more against it. Replicas already tried for this call are skipped while
+        others remain; if every replica is down the least loaded one is still used
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [r for r in self.replicas if r.available(now) and r.url not in tried]
+            if not candidates:
+                candidates = [r for r in self.replicas if r.url not in tried] or self.replicas
+            fewest = min(r.outstanding for r in candidates)
+            replica = random.choice([r for r in candidates if r.outstanding == fewest])
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica
+
+    def release(self, replica, ok):
+        """
+        Record the outcome of a call; repeated failures eject the replica for a while.
+        ok=None means the call never reached the replica and counts as neither
+        """
+        with self._lock:
+            replica.outstanding -= 1
+            if ok is None:
+                return
+            if ok:
+                replica.consecutive_failures = 0
+                return
+            replica.failures += 1
+            replica.consecutive_failures += 1
+            if replica.consecutive_failures >= self.eject_after:
+                replica.ejected_until = time.monotonic() + self.eject_seconds
+                replica.consecutive_failures = 0
+                logger.warning(f"Ejecting model server {replica.url} for {self.eject_seconds:.0f}s")
+
+    def has_untried(self, tried):
+        now = time.monotonic()
+        with self._lock:
+            return any(r.available(now) and r.url not in tried for r in self.replicas)
+
+    def check_health(self, session, timeout=2.0):
+        """Poll /health on every replica; only replicas with a loaded model take traffic"""
+        for replica in self.replicas:
+            try:
+                response = session.get(replica.url + '/health', timeout=timeout)
+                body = response.json() if response.status_code == 200 else {}
+                healthy = bool(body.get('ready', True) and body.get('model_loaded'))
+            except (requests.exceptions.RequestException, ValueError):
+                healthy = False
+            with self._lock:
+                if healthy != replica.healthy:
+                    logger.info(f"Model server {replica.url} is now {'healthy' if healthy else 'unhealthy'}")
+                replica.healthy = healthy
+
+    def start_health_checks(self):
+        if self.health_interval <= 0 or self._checker is not None:
+            return
+        session = requests.Session()
+
+        def run():
+            while True:
+                self.check_health(session)
+                time.sleep(self.health_interval)
+
+        self._checker = threading.Thread(target=run, name='model-server-health', daemon=True)
+        self._checker.start()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [replica.stats(now) for replica in self.replicas]
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling the model server while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Model server circuit is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class ModelServerError(Exception):
+    """The model server answered with a status other than 200"""
+
+    def __init__(self, status_code):
+        super().__init__(f"Model server responded with status {status_code}")
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, half_open_calls=1):
+        """
+        Args:
+            failure_threshold (int): Consecutive failed calls that open the circuit
+            reset_timeout (float): Seconds the circuit stays open before probing
+            half_open_calls (int): Trial calls let through while half open
+        """
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.half_open_calls = max(1, int(half_open_calls))
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+
+    def allow(self):
+        """
+        Reserve permission for one call
+
+        Raises:
+            CircuitOpenError: While open, or while half open with the probes in use
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(remaining)
+                self.state = self.HALF_OPEN
+                self._probes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.reset_timeout)
+                self._probes += 1
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                if self.state != self.CLOSED:
+                    logger.info("Model server circuit closed")
+                self.state = self.CLOSED
+                self._failures = 0
+                return
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Model server circuit opened for {self.reset_timeout:.0f}s")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._failures = 0
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "rejected": self.rejected}
+
+
+def image_digest(image_bytes):
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def is_real_prediction(result):
+    """True for a model prediction, False for error bodies and demo/fallback output"""
+    return (isinstance(result, dict) and 'error' not in result
+            and result.get('mode') == 'real' and 'prediction' in result)
+
+
+class LastKnownResults:
+    def __init__(self, max_entries=1000, ttl_seconds=86400.0):
+        """
+        Last successful model server result per image, served when the model
+        server cannot answer
+
+        Args:
+            max_entries (int): Least recently used results are dropped beyond this
+            ttl_seconds (float): Results older than this are not served
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.served = 0
+
+    def get(self, image_bytes):
+        key = image_digest(image_bytes)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.served += 1
+            return result
+
+    def put(self, image_bytes, result):
+        """
+        Remember result for image_bytes. Only real predictions are kept, so the
+        fallback never replays an error or a demo-mode guess as a classification
+
+        Returns:
+            bool: True if the result was stored
+        """
+        if not is_real_prediction(result):
+            return False
+        key = image_digest(image_bytes)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "served": self.served}
+
+
+class ModelServerClient:
+    def __init__(self, replicas=None, pool_size=32, connect_timeout=1.0, timeout=30.0,
+                 retries=2, backoff=0.1, breaker=None, results=None):
+        """
+        Args:
+            replicas (ReplicaPool): Model servers to route between, defaults to
+                model_server_urls() without health checks
+            breaker (CircuitBreaker): Fails calls fast while the model servers are down
+            results (LastKnownResults): Fallback results for predict()
+            pool_size (int): Keep-alive connections held open to each model server;
+                extra concurrent requests wait for a free connection (within
+                their deadline) instead of opening new sockets
+            connect_timeout (float): Seconds allowed to establish a connection
+            timeout (float): Default overall deadline per call, retries included
+            retries (int): Extra attempts after a retryable failure
+            backoff (float): First retry delay in seconds, doubled on each retry
+        """
+        self.replicas = replicas or ReplicaPool(model_server_urls(), health_interval=0)
+        self.connect_timeout = float(connect_timeout)
+        self.timeout = float(timeout)
+        self.retries = max(0, int(retries))
+        self.backoff = max(0.0, float(backoff))
+        self.breaker = breaker or CircuitBreaker()
+        self.results = results
+
+        # urllib3 waits for a free pooled connection without any timeout, so calls
+        # take one of pool_size slots per replica first, bounded by their deadline
+        self.pool_size = max(1, int(pool_size))
+        self._slots = {replica.url: threading.BoundedSemaphore(self.pool_size) for replica in self.replicas.replicas}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=len(self.replicas.replicas), pool_maxsize=self.pool_size,
+            pool_block=True, max_retries=0
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def classify(self, image_bytes, timeout=None):
+        """
+        Send one raw image to the model server
+
+        Args:
+            image_bytes (bytes): Encoded image file
+            timeout (float): Overall deadline in seconds, defaults to the client timeout
+
+        Returns:
+            requests.Response: The final response (which may still be an error status)
+
+        Raises:
+            requests.exceptions.ConnectionError / Timeout once retries or the deadline run out
+        """
+        return self.request(
+            'POST', PREDICT_PATH, timeout=timeout,
+            data=image_bytes, headers={'Content-Type': 'application/octet-stream'}
+        )
+
+    def predict(self, image_bytes, timeout=None):
+        """
+        Classify one image, falling back to its last known result
+
+        Returns:
+            tuple: (model server result dict, True if it came from the fallback cache)
+
+        Raises:
+            ModelServerError, requests.exceptions.ConnectionError (CircuitOpenError
+            while the breaker is open) or Timeout when there is no cached result
+        """
+        try:
+            response = self.classify(image_bytes, timeout=timeout)
+            if response.status_code == 200:
+                result = response.json()
+                if self.results:
+                    self.results.put(image_bytes, result)
+                return result, False
+            error = ModelServerError(response.status_code)
+        except requests.exceptions.RequestException as e:
+            error = e
+
+        cached = self.results.get(image_bytes) if self.results else None
+        if cached is not None:
+            logger.warning(f"Serving last known result ({error})")
+            return cached, True
+        raise error
+
+    def request(self, method, path, timeout=None, **kwargs):
+        """Call the model servers through the circuit breaker"""
+        self.breaker.allow()
+        ok = False
+        try:
+            response = self._request(method, path, timeout, **kwargs)
+            ok = response.status_code not in RETRY_STATUSES
+            return response
+        finally:
+            self.breaker.record(ok)
+
+    def _request(self, method, path, timeout=None, **kwargs):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        tried = set()
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout(f"Deadline exceeded calling {path}")
+
+            replica = self.replicas.acquire(tried)
+            tried.add(replica.url)
+            slot = self._slots[replica.url]
+            if not slot.acquire(timeout=remaining):
+                self.replicas.release(replica, None)
+                raise requests.exceptions.Timeout(f"Deadline exceeded waiting for a connection to {replica.url}")
+
+            response = None
+            ok = False
+            try:
+                try:
+                    remaining = max(deadline - time.monotonic(), 0.001)
+                    response = self.session.request(
+                        method, replica.url + path, timeout=(min(self.connect_timeout, remaining), remaining), **kwargs
+                    )
+                finally:
+                    # The body has been read, so the connection is back in the pool
+                    slot.release()
+                ok = response.status_code not in RETRY_STATUSES
+            except requests.exceptions.ConnectionError as e:
+                # Connection refused/reset and connect timeouts; read timeouts are
+                # not retried since the deadline is already spent waiting
+                if not self._should_retry(attempt, deadline, None, tried):
+                    raise
+                logger.warning(f"Model server {replica.url} connection failed ({e.__class__.__name__}), retrying")
+            else:
+                if ok or not self._should_retry(attempt, deadline, response, tried):
+                    return response
+                logger.warning(f"Model server {replica.url} returned {response.status_code}, retrying")
+                response.close()
+            finally:
+                self.replicas.release(replica, ok)
+
+            time.sleep(self._delay(attempt, response, tried))
+            attempt += 1
+
+    def _delay(self, attempt, response, tried=()):
+        # Move straight on when another healthy replica has not been tried yet
+        if self.replicas.has_untried(tried):
+            return 0.0
+        delay = self.backoff * (2 ** attempt)
+        # Honour Retry-After from a model server that is still loading
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            delay = max(delay, float(response.headers['Retry-After']))
+        return delay
+
+    def _should_retry(self, attempt, deadline, response, tried=()):
+        if attempt >= self.retries:
+            return False
+        return time.monotonic() + self._delay(attempt, response, tried) < deadline
+
+
+_client = None
+_replica_pool = None
+_breaker = None
+_results = None
+_client_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """Process-wide circuit breaker configured from the environment"""
+    global _breaker
+    with _client_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                failure_threshold=int(os.getenv('MODEL_BREAKER_FAILURES', '5')),
+                reset_timeout=float(os.getenv('MODEL_BREAKER_RESET_SECONDS', '10'))
+            )
+        return _breaker
+
+
+def get_last_known_results():
+    """Process-wide fallback cache, None when MODEL_RESULT_CACHE_SIZE=0"""
+    global _results
+    with _client_lock:
+        if _results is None and int(os.getenv('MODEL_RESULT_CACHE_SIZE', '1000')) > 0:
+            _results = LastKnownResults(
+                max_entries=int(os.getenv('MODEL_RESULT_CACHE_SIZE', '1000')),
+                ttl_seconds=float(os.getenv('MODEL_RESULT_CACHE_TTL', '86400'))
+            )
+        return _results
+
+
+def get_replica_pool():
+    """Process-wide replica pool configured from the environment, with health checks running"""
+    global _replica_pool
+    with _client_lock:
+        if _replica_pool is None:
+            _replica_pool = ReplicaPool(
+                model_server_urls(),
+                eject_after=int(os.getenv('MODEL_EJECT_AFTER', '3')),
+                eject_seconds=float(os.getenv('MODEL_EJECT_SECONDS', '15')),
+                health_interval=float(os.getenv('MODEL_HEALTH_INTERVAL', '5'))
+            )
+            _replica_pool.start_health_checks()
+            logger.info(f"Model servers: {', '.join(model_server_urls())}")
+        return _replica_pool
+
+
+def get_model_client():
+    """Process-wide client configured from the environment"""
+    global _client
+    replicas = get_replica_pool()
+    breaker = get_circuit_breaker()
+    results = get_last_known_results()
+    with _client_lock:
+        if _client is None:
+            _client = ModelServerClient(
+                replicas=replicas,
+                pool_size=int(os.getenv('MODEL_CLIENT_POOL_SIZE', '32')),
+                connect_timeout=float(os.getenv('MODEL_CLIENT_CONNECT_TIMEOUT', '1')),
+                timeout=float(os.getenv('MODEL_CLIENT_TIMEOUT', '30')),
+                retries=int(os.getenv('MODEL_CLIENT_RETRIES', '2')),
+                backoff=float(os.getenv('MODEL_CLIENT_BACKOFF', '0.1')),
+                breaker=breaker,
+                results=results
+            )
+        return _client
@@ -0,0 +1,105 @@
+"""
+Tests for the pooled model server client, against a local stand-in model server
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from model_client import ModelServerClient, ReplicaPool, CircuitBreaker, LastKnownResults
+
+
+class SlowModelServer(BaseHTTPRequestHandler):
+    delay = 1.5
+    body = {"prediction": "glass", "confidence": 0.9, "all_predictions": {"glass": 0.9}, "mode": "real"}
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.delay)
+        payload = json.dumps(self.body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def make_client(url, **kwargs):
+    return ModelServerClient(
+        replicas=ReplicaPool([url], health_interval=0),
+        breaker=CircuitBreaker(failure_threshold=100),
+        **kwargs
+    )
+
+
+def test_pool_wait_is_bounded_by_deadline():
+    server, url = start_server(SlowModelServer)
+    client = make_client(url, pool_size=1, timeout=2.0, retries=0)
+
+    outcomes = []
+    lock = threading.Lock()
+
+    def call():
+        start = time.monotonic()
+        try:
+            client.predict(b'image')
+            outcome = 'ok'
+        except requests.exceptions.Timeout:
+            outcome = 'timeout'
+        with lock:
+            outcomes.append((outcome, time.monotonic() - start))
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    # One call holds the only connection for 1.5s; the rest cannot get it within 2s
+    assert sorted(outcome for outcome, _ in outcomes) == ['ok', 'timeout', 'timeout', 'timeout']
+    assert max(elapsed for _, elapsed in outcomes) < 2.5
+
+
+def test_only_real_predictions_are_remembered():
+    class ErrorBody(SlowModelServer):
+        delay = 0.0
+        body = {"error": "cannot identify image file", "prediction": "unknown", "confidence": 0.0}
+
+    class DemoBody(SlowModelServer):
+        delay = 0.0
+        body = {"prediction": "paper", "confidence": 0.7, "mode": "demo"}
+
+    class RealBody(SlowModelServer):
+        delay = 0.0
+
+    for handler, remembered in ((ErrorBody, False), (DemoBody, False), (RealBody, True)):
+        server, url = start_server(handler)
+        results = LastKnownResults()
+        result, from_cache = make_client(url, results=results).predict(b'image')
+        server.shutdown()
+        assert result == handler.body and not from_cache
+        assert (results.get(b'image') is not None) == remembered
+
+
+if __name__ == '__main__':
+    test_pool_wait_is_bounded_by_deadline()
+    print("✅ Pool wait respects the call deadline")
+    test_only_real_predictions_are_remembered()
+    print("✅ Only real predictions are kept as fallback results")
@@ -0,0 +1,58 @@
+"""
+Compact binary framing for batch classification requests
+A batch body is the raw image files back to back, each preceded by its length
+as a 4-byte big-endian unsigned integer. Sent with Content-Type
+application/x-ecosage-batch it avoids the base64 and JSON overhead of
+{"images": [...]} and the boundary scanning of multipart uploads
+"""
+
+import struct
+
+BATCH_CONTENT_TYPE = 'application/x-ecosage-batch'
+
+_LENGTH = struct.Struct('>I')
+
+
+def pack_images(images):
+    """
+    Frame a list of encoded images into one request body
+
+    Args:
+        images (list): Raw image file bytes
+
+    Returns:
+        bytes: Length-prefixed batch body
+    """
+    parts = []
+    for image_bytes in images:
+        parts.append(_LENGTH.pack(len(image_bytes)))
+        parts.append(image_bytes)
+    return b''.join(parts)
+
+
+def unpack_images(body, max_images=None):
+    """
+    Split a length-prefixed batch body back into individual images
+
+    Args:
+        body (bytes): Request body written by pack_images
+        max_images (int): Stop with an error once more images than this are found
+
+    Returns:
+        list: Raw image file bytes in upload order
+    """
+    images = []
+    view = memoryview(body)
+    offset = 0
+    while offset < len(view):
+        if offset + _LENGTH.size > len(view):
+            raise ValueError(f"Truncated length prefix at byte {offset}")
+        length, = _LENGTH.unpack_from(view, offset)
+        offset += _LENGTH.size
+        if offset + length > len(view):
+            raise ValueError(f"Image {len(images)} claims {length} bytes but only {len(view) - offset} remain")
+        images.append(bytes(view[offset:offset + length]))
+        offset += length
+        if max_images is not None and len(images) > max_images:
+            raise OverflowError(f"Too many images (max {max_images})")
+    return images
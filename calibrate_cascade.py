@@ -0,0 +1,120 @@
+"""
+Pick the model cascade threshold from the validation split
+Runs the first stage and the full model over Dataset/val, then chooses the
+lowest first-stage confidence threshold (fewest images sent to the full
+model) whose cascade accuracy still meets the target. The server reads the
+result from cascade_calibration.json when CASCADE_ENABLED=1
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from cascade import CALIBRATION_PATH, load_stage_backend
+from evaluation import list_split, read_bytes, time_per_image
+from model_architecture import find_model_path
+from preprocessing import preprocess_image_bytes
+
+
+def predict_backend(backend, arrays, batch_size=32):
+    return np.concatenate([
+        backend.predict(np.stack(arrays[start:start + batch_size]))
+        for start in range(0, len(arrays), batch_size)
+    ], axis=0)
+
+
+def choose_threshold(first_probs, full_probs, labels, target_accuracy):
+    """
+    Lowest threshold whose cascade accuracy reaches target_accuracy
+
+    Returns:
+        dict: threshold, accuracy and escalation_rate, or None if no threshold
+        (not even sending everything to the full model) meets the target
+    """
+    confidence = first_probs.max(axis=1)
+    first_correct = first_probs.argmax(axis=1) == labels
+    full_correct = full_probs.argmax(axis=1) == labels
+
+    # Every distinct confidence is a possible cut; above the maximum everything escalates
+    candidates = np.concatenate([[0.0], np.unique(confidence), [np.nextafter(confidence.max(), 2.0)]])
+    for threshold in candidates:
+        escalate = confidence < threshold
+        accuracy = float(np.mean(np.where(escalate, full_correct, first_correct)))
+        if accuracy >= target_accuracy:
+            return {"threshold": float(threshold), "accuracy": accuracy, "escalation_rate": float(np.mean(escalate))}
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the confidence-gated model cascade")
+    parser.add_argument('--data-dir', default='Dataset')
+    parser.add_argument('--first-stage', default='int8',
+                        help="'int8', or a .onnx / .ecosage / .pth file (e.g. a MobileNetV2 checkpoint)")
+    parser.add_argument('--model', default=None, help="Full model checkpoint, defaults to the first trained model found")
+    parser.add_argument('--target-accuracy', type=float, default=None,
+                        help="Required cascade top-1 accuracy, defaults to the full model's minus --max-drop")
+    parser.add_argument('--max-drop', type=float, default=0.005)
+    parser.add_argument('--output', default=CALIBRATION_PATH)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    model_path = args.model or find_model_path()
+    if model_path is None:
+        print("❌ No trained model found")
+        return
+
+    print(f"🔍 First stage: {args.first_stage}, full model: {model_path}")
+    first_stage = load_stage_backend(args.first_stage)
+    full_model = load_stage_backend(model_path)
+
+    samples = list_split(args.data_dir, 'val')
+    labels = np.array([label for _, label in samples])
+    arrays = [preprocess_image_bytes(read_bytes(path)) for path, _ in samples]
+    first_probs = predict_backend(first_stage, arrays, args.batch_size)
+    full_probs = predict_backend(full_model, arrays, args.batch_size)
+
+    first_accuracy = float(np.mean(first_probs.argmax(axis=1) == labels))
+    full_accuracy = float(np.mean(full_probs.argmax(axis=1) == labels))
+    target = args.target_accuracy if args.target_accuracy is not None else full_accuracy - args.max_drop
+
+    chosen = choose_threshold(first_probs, full_probs, labels, target)
+    if chosen is None:
+        print(f"❌ No threshold reaches {target:.4f} accuracy (full model alone: {full_accuracy:.4f})")
+        return
+
+    # Per-image cost at a typical micro-batch size
+    batch = [np.stack(arrays[:8])] * 3
+    first_stage.predict(batch[0])
+    full_model.predict(batch[0])
+    first_ms = time_per_image(first_stage.predict, batch) / 8
+    full_ms = time_per_image(full_model.predict, batch) / 8
+    cascade_ms = first_ms + chosen['escalation_rate'] * full_ms
+
+    calibration = dict(
+        chosen,
+        first_stage=args.first_stage,
+        full_model=model_path,
+        target_accuracy=target,
+        first_stage_accuracy=first_accuracy,
+        full_accuracy=full_accuracy,
+        images=len(labels)
+    )
+    with open(args.output, 'w') as f:
+        json.dump(calibration, f, indent=2)
+
+    print("\n--- CASCADE CALIBRATION REPORT ---")
+    print(f"Validation images:     {len(labels)}")
+    print(f"First stage accuracy:  {first_accuracy:.4f}")
+    print(f"Full model accuracy:   {full_accuracy:.4f}")
+    print(f"Target accuracy:       {target:.4f}")
+    print(f"Chosen threshold:      {chosen['threshold']:.4f}")
+    print(f"Cascade accuracy:      {chosen['accuracy']:.4f}")
+    print(f"Sent to full model:    {chosen['escalation_rate'] * 100:.1f}%")
+    print(f"Estimated cost:        {cascade_ms:.1f} ms/image vs {full_ms:.1f} ms/image full model "
+          f"({full_ms / cascade_ms:.1f}x faster)")
+    print(f"💾 Saved calibration to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Confidence-gated model cascade for the EcoSage model server
+A cheap first-stage model answers every image; only images whose top-1
+confidence falls below the threshold are sent to the full model. The cascade
+exposes the same predict()/describe() interface as the other inference
+backends, so batching, caching and TTA work unchanged
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from inference_backends import TorchBackend, OnnxRuntimeBackend
+
+CALIBRATION_PATH = "cascade_calibration.json"
+
+
+def load_stage_backend(spec, device='cpu'):
+    """
+    Load one cascade stage as an inference backend
+
+    Args:
+        spec (str): 'int8' for the quantize_model.py archive (INT8_MODEL_PATH),
+            or a path to an .onnx export, a build_model_artifact.py .ecosage
+            file, or a .pth checkpoint (plain ResNet18 / MobileNetV2 state dict
+            or a self-describing train.py --mode distill student)
+        device: Device for PyTorch stages
+
+    Returns:
+        Backend with predict(np_batch) -> np probabilities
+    """
+    if spec.endswith('.onnx'):
+        return OnnxRuntimeBackend(spec, intra_op_threads=int(os.getenv('ORT_NUM_THREADS', '0')))
+
+    if spec == 'int8':
+        from model_architecture import INT8_MODEL_PATH, load_quantized_classifier
+        model = load_quantized_classifier(os.getenv('INT8_MODEL_PATH', INT8_MODEL_PATH),
+                                          backend=os.getenv('QUANTIZED_ENGINE', 'x86'))
+        return TorchBackend(model)
+
+    if spec.endswith('.ecosage'):
+        from model_artifact import load_model_artifact
+        model, metadata = load_model_artifact(spec, device)
+        return TorchBackend(model, device, metadata.get('channels_last', False))
+
+    from model_architecture import load_checkpoint_model
+    model, _ = load_checkpoint_model(spec, device)
+    return TorchBackend(model, device)
+
+
+def calibrated_threshold(path=CALIBRATION_PATH, first_stage=None, default=0.8):
+    """
+    Threshold written by calibrate_cascade.py, or the default if there is none
+
+    Args:
+        path (str): Calibration JSON
+        first_stage (str): Stage spec being served; a calibration measured for a
+            different first stage raises ValueError instead of being applied
+        default (float): Threshold used, with a warning, when the file is missing
+    """
+    if not os.path.exists(path):
+        print(f"⚠️ No cascade calibration at {path} (run calibrate_cascade.py), using uncalibrated threshold {default:.3f}")
+        return default
+    with open(path) as f:
+        calibration = json.load(f)
+
+    calibrated_for = calibration.get('first_stage')
+    if first_stage is not None and (calibrated_for is None or os.path.normpath(calibrated_for) != os.path.normpath(first_stage)):
+        raise ValueError(f"{path} was calibrated for first stage {calibrated_for}, not {first_stage}")
+    return float(calibration['threshold'])
+
+
+class CascadeBackend:
+    name = 'cascade'
+
+    def __init__(self, first_stage, second_stage, threshold=0.8):
+        """
+        Args:
+            first_stage: Cheap backend that answers confident images
+            second_stage: Full model backend for everything else
+            threshold (float): Minimum first-stage top-1 confidence to accept
+        """
+        self.first_stage = first_stage
+        self.second_stage = second_stage
+        self.threshold = float(threshold)
+
+        self._lock = threading.Lock()
+        self._images = 0
+        self._escalated = 0
+
+    def predict(self, batch):
+        probabilities = self.first_stage.predict(batch)
+        escalate = probabilities.max(axis=1) < self.threshold
+
+        if escalate.any():
+            probabilities = probabilities.copy()
+            probabilities[escalate] = self.second_stage.predict(np.ascontiguousarray(batch[escalate]))
+
+        with self._lock:
+            self._images += len(batch)
+            self._escalated += int(escalate.sum())
+        return probabilities
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "images": self._images,
+                "escalated": self._escalated,
+                "escalation_rate": (self._escalated / self._images) if self._images else 0.0
+            }
+
+    def describe(self):
+        return {
+            "backend": self.name,
+            "first_stage": self.first_stage.describe(),
+            "second_stage": self.second_stage.describe(),
+            **self.stats()
+        }
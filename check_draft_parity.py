@@ -0,0 +1,76 @@
+"""
+Accuracy parity check for draft-mode (reduced-size) JPEG decoding
+Classifies Dataset/val with full decoding and with DECODE_MODE=draft decoding
+and reports accuracy, top-1 agreement and decode time for both
+"""
+
+import argparse
+import io
+
+import numpy as np
+from PIL import Image
+
+from evaluation import list_split, read_bytes, predict_arrays, time_per_image
+from model_architecture import find_model_path, load_checkpoint_model
+from preprocessing import preprocess_image_bytes, decode_image
+
+
+def upscale_jpeg(image_bytes, width):
+    image = decode_image(image_bytes)
+    height = round(image.height * width / image.width)
+    buffer = io.BytesIO()
+    image.resize((width, height), Image.BICUBIC).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full and draft JPEG decoding on a dataset split")
+    parser.add_argument('--data-dir', default='Dataset')
+    parser.add_argument('--split', default='val')
+    parser.add_argument('--model', default=None, help="Defaults to the first trained model found")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--upscale-width', type=int, default=0,
+                        help="Re-encode each image as a JPEG this wide first, to mimic phone uploads")
+    args = parser.parse_args()
+
+    model_path = args.model or find_model_path()
+    if model_path is None:
+        print("❌ No trained model found")
+        return
+
+    print(f"🔍 Loading model from: {model_path}")
+    model, _ = load_checkpoint_model(model_path, 'cpu')
+
+    samples = list_split(args.data_dir, args.split)
+    labels = np.array([label for _, label in samples])
+    images = [read_bytes(path) for path, _ in samples]
+    if args.upscale_width:
+        images = [upscale_jpeg(image_bytes, args.upscale_width) for image_bytes in images]
+    print(f"📊 Evaluating {len(images)} images from {args.data_dir}/{args.split}")
+
+    reduced = sum(
+        1 for image_bytes in images
+        if decode_image(image_bytes, draft=True).size != decode_image(image_bytes).size
+    )
+
+    full_ms = time_per_image(lambda b: preprocess_image_bytes(b, draft=False), images)
+    draft_ms = time_per_image(lambda b: preprocess_image_bytes(b, draft=True), images)
+
+    full_probs = predict_arrays(model, [preprocess_image_bytes(b, draft=False) for b in images], args.batch_size)
+    draft_probs = predict_arrays(model, [preprocess_image_bytes(b, draft=True) for b in images], args.batch_size)
+
+    full_preds = full_probs.argmax(axis=1)
+    draft_preds = draft_probs.argmax(axis=1)
+
+    print("\n--- DRAFT DECODE PARITY ---")
+    print(f"Images decoded at reduced scale: {reduced}/{len(images)}")
+    print(f"Full decode accuracy:  {np.mean(full_preds == labels):.4f}")
+    print(f"Draft decode accuracy: {np.mean(draft_preds == labels):.4f}")
+    print(f"Top-1 agreement:       {np.mean(full_preds == draft_preds):.4f}")
+    print(f"Max probability diff:  {np.abs(full_probs - draft_probs).max():.4f}")
+    print(f"Preprocess time full:  {full_ms:.2f} ms/image")
+    print(f"Preprocess time draft: {draft_ms:.2f} ms/image")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Sampled, asynchronous capture of request images for debugging the model server
+Requests only pay for a random draw and a non-blocking queue put; a background
+thread writes the images into a fixed-size ring of files, and captures are
+dropped rather than queued when the writer falls behind
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+
+def _extension(image_bytes):
+    if image_bytes[:3] == b'\xff\xd8\xff':
+        return '.jpg'
+    if image_bytes[:8] == b'\x89PNG\r\n\x1a\n':
+        return '.png'
+    return '.bin'
+
+
+class DebugCapture:
+    def __init__(self, directory='debug_captures', sample_rate=0.01, max_files=100,
+                 max_queue=32, max_image_bytes=16 * 1024 * 1024):
+        """
+        Args:
+            directory (str): Where captured images are written
+            sample_rate (float): Fraction of requests to capture, 0 to 1
+            max_files (int): Size of the ring; the oldest capture is overwritten
+            max_queue (int): Captures waiting for the writer before new ones are dropped
+            max_image_bytes (int): Larger images are never captured
+        """
+        self.directory = directory
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.max_files = max(1, int(max_files))
+        self.max_image_bytes = int(max_image_bytes)
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._next_slot = 0
+        self._captured = 0
+        self._dropped = 0
+        self._errors = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._worker = threading.Thread(target=self._run, name='debug-capture', daemon=True)
+        self._worker.start()
+
+    def capture(self, image_bytes, result=None):
+        """
+        Maybe queue an image (and its prediction) for writing, never blocks
+
+        Returns:
+            bool: True if the image was queued
+        """
+        if random.random() >= self.sample_rate or len(image_bytes) > self.max_image_bytes:
+            return False
+        try:
+            self._queue.put_nowait((image_bytes, result, time.time()))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "sample_rate": self.sample_rate,
+                "max_files": self.max_files,
+                "captured": self._captured,
+                "dropped": self._dropped,
+                "errors": self._errors,
+                "queued": self._queue.qsize()
+            }
+
+    def _write(self, image_bytes, result, timestamp):
+        with self._lock:
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.max_files
+
+        base = os.path.join(self.directory, f"capture_{slot:04d}")
+        # Remove the previous occupant of this slot, whatever its extension was
+        for ext in ('.jpg', '.png', '.bin'):
+            if os.path.exists(base + ext):
+                os.remove(base + ext)
+
+        # Write to a temporary name and rename so readers never see a partial file
+        path = base + _extension(image_bytes)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(image_bytes)
+        os.replace(path + '.tmp', path)
+
+        with open(base + '.json.tmp', 'w') as f:
+            json.dump({"timestamp": timestamp, "file": os.path.basename(path), "result": result}, f, default=str)
+        os.replace(base + '.json.tmp', base + '.json')
+
+    def _run(self):
+        while True:
+            image_bytes, result, timestamp = self._queue.get()
+            try:
+                self._write(image_bytes, result, timestamp)
+                with self._lock:
+                    self._captured += 1
+            except Exception as e:
+                print(f"⚠️ Debug capture failed: {e}")
+                with self._lock:
+                    self._errors += 1
@@ -0,0 +1,59 @@
+"""
+Shared helpers for the EcoSage evaluation and parity tools
+"""
+
+import os
+import time
+
+import numpy as np
+import torch
+
+CLASSES = ['cardboard', 'glass', 'metal', 'paper', 'plastic', 'trash']
+
+
+def list_split(data_dir, split='val', classes=CLASSES):
+    """
+    List the labelled images of one dataset split
+
+    Returns:
+        list: (image_path, class_index) pairs, sorted for reproducible runs
+    """
+    samples = []
+    split_dir = os.path.join(data_dir, split)
+    for class_index, class_name in enumerate(classes):
+        class_dir = os.path.join(split_dir, class_name)
+        if not os.path.isdir(class_dir):
+            print(f"⚠️ Missing class folder: {class_dir}")
+            continue
+        for file_name in sorted(os.listdir(class_dir)):
+            samples.append((os.path.join(class_dir, file_name), class_index))
+    return samples
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def predict_arrays(model, arrays, batch_size=32):
+    """
+    Run a model over preprocessed (3, 224, 224) arrays
+
+    Returns:
+        np.ndarray: Softmax probabilities shaped (N, num_classes)
+    """
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(arrays), batch_size):
+            batch = torch.from_numpy(np.stack(arrays[start:start + batch_size]))
+            outputs.append(torch.softmax(model(batch), dim=1).numpy())
+    return np.concatenate(outputs, axis=0)
+
+
+def time_per_image(fn, inputs, repeats=1):
+    """Average wall-clock milliseconds of fn over each input"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for item in inputs:
+            fn(item)
+    return (time.perf_counter() - start) * 1000.0 / (len(inputs) * repeats)
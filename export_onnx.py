@@ -0,0 +1,97 @@
+"""
+ONNX export for the EcoSage waste classifier
+Converts a trained checkpoint (a v1/v2 ResNet18 state dict or a self-describing
+student checkpoint) to ONNX with a dynamic batch axis and checks ONNX Runtime against PyTorch
+"""
+
+import argparse
+import inspect
+import os
+
+import numpy as np
+import torch
+
+from evaluation import list_split, read_bytes, predict_arrays, time_per_image
+from inference_backends import OnnxRuntimeBackend, ONNX_MODEL_PATH
+from model_architecture import find_model_path, load_checkpoint_model
+from preprocessing import preprocess_image_bytes
+
+
+def export_onnx(model, output_path, opset=18):
+    """Export an eval-mode model with inputs named 'input' and a dynamic batch axis"""
+    example = torch.randn(1, 3, 224, 224)
+
+    # Newer exporters write weights to a side file by default; keep one self-contained file
+    options = {}
+    if 'external_data' in inspect.signature(torch.onnx.export).parameters:
+        options['external_data'] = False
+
+    torch.onnx.export(
+        model,
+        (example,),
+        output_path,
+        input_names=['input'],
+        output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=opset,
+        **options
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the waste classifier to ONNX")
+    parser.add_argument('--model', default=None, help="Checkpoint to export, defaults to the first trained model found")
+    parser.add_argument('--output', default=ONNX_MODEL_PATH)
+    parser.add_argument('--opset', type=int, default=18)
+    parser.add_argument('--data-dir', default='Dataset', help="Validation images used for the parity check")
+    parser.add_argument('--parity-images', type=int, default=128)
+    parser.add_argument('--tolerance', type=float, default=1e-4, help="Max allowed probability difference")
+    args = parser.parse_args()
+
+    model_path = args.model or find_model_path()
+    if model_path is None:
+        print("❌ No trained model found")
+        return
+
+    print(f"🔍 Loading model from: {model_path}")
+    model, _ = load_checkpoint_model(model_path, 'cpu')
+
+    export_onnx(model, args.output, args.opset)
+    print(f"💾 Saved ONNX model to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+    # Parity check on real images when available, random inputs otherwise
+    samples = list_split(args.data_dir, 'val') if os.path.isdir(os.path.join(args.data_dir, 'val')) else []
+    if samples:
+        step = max(1, len(samples) // args.parity_images)
+        arrays = [preprocess_image_bytes(read_bytes(path)) for path, _ in samples[::step][:args.parity_images]]
+    else:
+        print("⚠️ No validation images found, checking parity on random inputs")
+        arrays = list(np.random.randn(args.parity_images, 3, 224, 224).astype(np.float32))
+
+    backend = OnnxRuntimeBackend(args.output)
+    torch_probs = predict_arrays(model, arrays, batch_size=16)
+    onnx_probs = np.concatenate([
+        backend.predict(np.stack(arrays[start:start + 16])) for start in range(0, len(arrays), 16)
+    ])
+
+    max_diff = float(np.abs(torch_probs - onnx_probs).max())
+    agreement = float(np.mean(torch_probs.argmax(axis=1) == onnx_probs.argmax(axis=1)))
+
+    batch = [np.stack(arrays[:8])] * 3
+    with torch.no_grad():
+        torch_ms = time_per_image(lambda b: model(torch.from_numpy(b)), batch) / 8
+    onnx_ms = time_per_image(backend.predict, batch) / 8
+
+    print("\n--- ONNX PARITY REPORT ---")
+    print(f"Images compared:      {len(arrays)}")
+    print(f"Max probability diff: {max_diff:.2e}")
+    print(f"Top-1 agreement:      {agreement:.4f}")
+    print(f"Batch 8 latency:      PyTorch {torch_ms:.1f} ms/image, ONNX Runtime {onnx_ms:.1f} ms/image")
+    if max_diff > args.tolerance or agreement < 1.0:
+        print(f"❌ Parity check failed (tolerance {args.tolerance})")
+        raise SystemExit(1)
+    print("✅ Parity check passed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Inference backends for the EcoSage model server
+Each backend takes a preprocessed float32 batch shaped (N, 3, 224, 224) and
+returns softmax probabilities as a numpy array shaped (N, num_classes)
+"""
+
+import time
+
+import numpy as np
+
+# ONNX model written by export_onnx.py
+ONNX_MODEL_PATH = "waste_classifier_model_v2.onnx"
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def warmup(backend, batch_sizes, iterations=2):
+    """
+    Run a few forward passes at each batch size so graph specialization,
+    kernel selection and allocator growth happen before the first request
+
+    Returns:
+        dict: Milliseconds per forward pass for each batch size after warmup
+    """
+    timings = {}
+    for batch_size in batch_sizes:
+        example = np.zeros((batch_size, 3, 224, 224), dtype=np.float32)
+        for _ in range(iterations):
+            backend.predict(example)
+        start = time.perf_counter()
+        backend.predict(example)
+        timings[batch_size] = (time.perf_counter() - start) * 1000.0
+    return timings
+
+
+class TorchBackend:
+    name = 'torch'
+
+    def __init__(self, model, device='cpu', channels_last=False):
+        """
+        Args:
+            model: Eager, TorchScript or compiled PyTorch model in eval mode
+            device: Device the model lives on
+            channels_last (bool): Feed inputs in NHWC layout
+        """
+        import torch
+
+        self._torch = torch
+        self.model = model
+        self.device = device
+        self.channels_last = channels_last
+
+    def predict(self, batch):
+        torch = self._torch
+        inputs = torch.from_numpy(batch).to(self.device)
+        if self.channels_last:
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+
+        with torch.no_grad():
+            return torch.softmax(self.model(inputs), dim=1).cpu().numpy()
+
+    def describe(self):
+        return {"backend": self.name, "device": str(self.device), "channels_last": self.channels_last}
+
+
+class OnnxRuntimeBackend:
+    name = 'onnxruntime'
+
+    def __init__(self, model_path, intra_op_threads=0):
+        """
+        Args:
+            model_path (str): ONNX file written by export_onnx.py
+            intra_op_threads (int): Threads per forward pass, 0 lets ONNX Runtime decide
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        logits = self.session.run(None, {self.input_name: batch})[0]
+        return softmax(logits)
+
+    def describe(self):
+        return {"backend": self.name, "device": "cpu", "model_path": self.model_path}
@@ -0,0 +1,144 @@
+"""
+Dynamic micro-batching for the EcoSage model server
+Collects inference requests that arrive within a short time window and runs
+them through the model as one batch on a single worker thread. Items are
+arrays of images (len(item) rows), and the batch cap counts images, so no
+forward pass is larger than the sizes the model was warmed up for
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+def warmup_batch_sizes(max_batch_size):
+    """Powers of two up to and including max_batch_size"""
+    sizes = []
+    size = 1
+    while size < max_batch_size:
+        sizes.append(size)
+        size *= 2
+    sizes.append(max_batch_size)
+    return sizes
+
+
+class MicroBatcher:
+    def __init__(self, infer_fn, max_batch_size=8, max_wait_ms=5.0, name="micro-batcher"):
+        """
+        Args:
+            infer_fn (callable): Takes a list of submitted items and returns a
+                list of results in the same order
+            max_batch_size (int): Maximum number of images (rows summed over
+                the items) run in one batch
+            max_wait_ms (float): How long to wait for more items after the
+                first one arrives before running the batch
+        """
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        # An item that would have overflowed the previous batch starts the next one
+        self._held = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._images = 0
+        self._largest_batch = 0
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """
+        Queue an item for the next batch and return a Future for its result
+
+        Raises:
+            ValueError: If the item alone has more than max_batch_size images;
+                callers split larger arrays into chunks
+        """
+        if len(item) > self.max_batch_size:
+            raise ValueError(f"Item has {len(item)} images, more than the batch limit of {self.max_batch_size}")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit an item and block until its result is ready"""
+        return self.submit(item).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "items": self._items,
+                "images": self._images,
+                "largest_batch": self._largest_batch,
+                "avg_batch_size": (self._images / self._batches) if self._batches else 0.0,
+                "queued": self._queue.qsize()
+            }
+
+    def _add(self, batch, size, entry):
+        """Add entry if it fits, otherwise hold it for the next batch; returns the new size or None"""
+        entry_size = len(entry[0])
+        if size + entry_size > self.max_batch_size:
+            self._held = entry
+            return None
+        batch.append(entry)
+        return size + entry_size
+
+    def _collect(self):
+        # Block for the first item, then keep gathering until the window
+        # closes or the next item would take the batch over max_batch_size images
+        if self._held is not None:
+            first, self._held = self._held, None
+        else:
+            first = self._queue.get()
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size is not None and size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                size = self._add(batch, size, self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # Grab anything that is already waiting without extending the window
+        while size is not None and size < self.max_batch_size:
+            try:
+                size = self._add(batch, size, self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+
+            try:
+                results = self.infer_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+
+            images = sum(len(item) for item in items)
+            with self._lock:
+                self._batches += 1
+                self._items += len(items)
+                self._images += images
+                self._largest_batch = max(self._largest_batch, images)
@@ -3,6 +3,7 @@ Model Architecture Definition for EcoSage Waste Classifier
 This file defines the exact model architecture used during training
 """
 
+import os
 import torch
 import torch.nn as nn
 from torchvision import models
@@ -31,17 +32,214 @@ class WasteClassifierModel(nn.Module):
     def forward(self, x):
         return self.model(x)
 
-def load_waste_classifier(model_path, device='cpu'):
+# Where the server and tools look for trained weights, in order of preference
+MODEL_PATHS = [
+    "waste_classifier_model_v2.pth",
+    "waste_classifier_model.pth",
+    "backend/waste_classifier_model_v2.pth",
+    "backend/waste_classifier_model.pth"
+]
+
+# TorchScript INT8 model written by quantize_model.py
+INT8_MODEL_PATH = "waste_classifier_model_v2_int8.pt"
+
+# Memory-mapped weight file written by build_model_artifact.py --format mmap
+SHARED_WEIGHTS_PATH = "waste_classifier_model_v2.ecow"
+
+def find_model_path(model_paths=MODEL_PATHS):
+    """Return the first trained model file that exists, or None"""
+    for model_path in model_paths:
+        if os.path.exists(model_path):
+            return model_path
+    return None
+
+def create_resnet18_for_checkpoint(checkpoint, num_classes=6):
+    """
+    Create the plain torchvision ResNet18 whose final layer matches a saved state dict
+    
+    Args:
+        checkpoint (dict): State dict saved by train.py (v2) or the original script (v1)
+        num_classes (int): Number of output classes
+        
+    Returns:
+        torch.nn.Module: Untrained model ready for load_state_dict
+    """
+    model = models.resnet18(pretrained=False)
+    
+    # Try different architectures based on the keys in the checkpoint
+    if 'fc.1.weight' in checkpoint:
+        # v2 model has Sequential final layer: fc = nn.Sequential(nn.Dropout(), nn.Linear(...))
+        print("🔧 Detected v2 model architecture with Sequential final layer")
+        model.fc = nn.Sequential(
+            nn.Dropout(0.5),
+            nn.Linear(model.fc.in_features, num_classes)
+        )
+    elif 'fc.weight' in checkpoint:
+        # v1 model has simple Linear final layer
+        print("🔧 Detected v1 model architecture with Linear final layer")
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    else:
+        print("⚠️ Unknown model structure, trying default ResNet18")
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    
+    return model
+
+def create_model_for_checkpoint(checkpoint, num_classes=6):
+    """
+    Create an untrained model whose architecture matches a saved state dict
+    
+    Recognises MobileNetV2 (features.* / classifier.1.*) and falls back to the
+    ResNet18 variants handled by create_resnet18_for_checkpoint
+    """
+    if 'classifier.1.weight' in checkpoint and 'features.0.0.weight' in checkpoint:
+        print("🔧 Detected MobileNetV2 architecture")
+        model = models.mobilenet_v2(weights=None)
+        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
+        return model
+    return create_resnet18_for_checkpoint(checkpoint, num_classes)
+
+# Self-describing checkpoints (train.py --mode distill) carry their own architecture
+CHECKPOINT_FORMAT = 'ecosage-checkpoint'
+STUDENT_ARCHS = ['mobilenet_v2', 'mobilenet_v3_small', 'resnet10']
+
+def build_classifier(arch, num_classes=6, pretrained=False):
+    """
+    Create a classifier by architecture name with a num_classes output layer
+    
+    Args:
+        arch (str): 'resnet18' (the served model, with dropout head) or one of STUDENT_ARCHS
+        num_classes (int): Number of output classes
+        pretrained (bool): Start from ImageNet weights where torchvision has them
+    """
+    weights = 'IMAGENET1K_V1' if pretrained else None
+    if arch == 'resnet18':
+        model = models.resnet18(weights=weights)
+        model.fc = nn.Sequential(nn.Dropout(p=0.5), nn.Linear(model.fc.in_features, num_classes))
+    elif arch == 'resnet10':
+        # One BasicBlock per stage: roughly half the FLOPs of ResNet18
+        if pretrained:
+            print("⚠️ No ImageNet weights for resnet10, starting from scratch")
+        model = models.ResNet(models.resnet.BasicBlock, [1, 1, 1, 1])
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    elif arch == 'mobilenet_v2':
+        model = models.mobilenet_v2(weights=weights)
+        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
+    elif arch == 'mobilenet_v3_small':
+        model = models.mobilenet_v3_small(weights=weights)
+        model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
+    else:
+        raise ValueError(f"Unknown architecture: {arch}")
+    return model
+
+def save_classifier_checkpoint(model, path, arch, classes, **metadata):
+    """
+    Save a checkpoint that records its architecture, classes and provenance
+    
+    Args:
+        model (torch.nn.Module): Trained model
+        path (str): Output file
+        arch (str): Name accepted by build_classifier
+        classes (list): Class names in output order
+        **metadata: Extra details such as the teacher and distillation settings
+    """
+    torch.save(dict(
+        metadata,
+        format=CHECKPOINT_FORMAT,
+        arch=arch,
+        classes=list(classes),
+        input_size=224,
+        mean=[0.485, 0.456, 0.406],
+        std=[0.229, 0.224, 0.225],
+        state_dict=model.state_dict()
+    ), path)
+
+def load_checkpoint_model(model_path, device='cpu'):
+    """
+    Load a self-describing checkpoint or a plain state dict saved by train.py
+    
+    Returns:
+        tuple: (eval-mode model on device, checkpoint metadata dict, empty for plain state dicts)
+    """
+    checkpoint = torch.load(model_path, map_location=device)
+    if checkpoint.get('format') == CHECKPOINT_FORMAT:
+        print(f"🔧 Loading self-describing {checkpoint['arch']} checkpoint")
+        model = build_classifier(checkpoint['arch'], len(checkpoint['classes']))
+        model.load_state_dict(checkpoint['state_dict'])
+        info = {key: value for key, value in checkpoint.items() if key != 'state_dict'}
+    else:
+        model = create_model_for_checkpoint(checkpoint)
+        model.load_state_dict(checkpoint)
+        info = {}
+    model.eval()
+    return model.to(device), info
+
+def load_quantized_classifier(model_path=INT8_MODEL_PATH, backend='x86'):
+    """
+    Load a TorchScript INT8 model produced by quantize_model.py
+    
+    Args:
+        model_path (str): Path to the saved TorchScript archive
+        backend (str): Quantized kernel backend the model was calibrated for
+        
+    Returns:
+        torch.jit.ScriptModule: Loaded model (CPU only)
+    """
+    torch.backends.quantized.engine = backend
+    model = torch.jit.load(model_path, map_location='cpu')
+    model.eval()
+    return model
+
+def load_shared_classifier(model_path=SHARED_WEIGHTS_PATH):
+    """
+    Build a classifier whose parameters point straight into a memory-mapped weight file
+    
+    Every process that loads the same file shares its physical pages, so the
+    weights cost one page-cache copy per node instead of one copy per worker.
+    The parameters are read-only; moving the model to another device or
+    re-running Conv+BN fusion would make private copies again
+    
+    Args:
+        model_path (str): Weight file written by weight_store.save_weights
+        
+    Returns:
+        tuple: (torch.nn.Module on CPU in eval mode, metadata dict)
+    """
+    from weight_store import load_weights
+    from model_optimization import fuse_conv_bn
+    
+    state_dict, metadata = load_weights(model_path)
+    
+    # Build the module skeleton on the meta device so no throwaway weights are allocated
+    with torch.device('meta'):
+        num_classes = len(metadata.get('classes', [])) or 6
+        if metadata.get('arch', 'resnet18') == 'resnet18':
+            model = create_resnet18_for_checkpoint(state_dict, num_classes)
+        else:
+            model = build_classifier(metadata['arch'], num_classes)
+        model.eval()
+        if metadata.get('fused'):
+            fuse_conv_bn(model)
+    
+    # assign=True keeps the mapped tensors instead of copying into the skeleton
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
+    return model, metadata
+
+def load_waste_classifier(model_path, device='cpu', precision='fp32'):
     """
     Load a waste classifier model from file
     
     Args:
         model_path (str): Path to the saved model
         device (str): Device to load model on
+        precision (str): 'fp32', or 'int8' for a quantize_model.py archive (CPU only)
         
     Returns:
         torch.nn.Module: Loaded model
     """
+    if precision == 'int8':
+        return load_quantized_classifier(model_path)
+    
     try:
         # Try to load checkpoint
         checkpoint = torch.load(model_path, map_location=device)
@@ -102,8 +300,6 @@ def load_waste_classifier(model_path, device='cpu'):
 
 if __name__ == "__main__":
     # Test the model loading
-    import os
-    
     model_paths = [
         "waste_classifier_model_v2.pth",
         "waste_classifier_model.pth"
@@ -0,0 +1,50 @@
+"""
+Self-describing model artifacts for fast model server startup
+An artifact is a frozen TorchScript graph (Conv+BN already folded) with a
+metadata.json entry describing classes and preprocessing, so loading it needs
+neither torchvision nor checkpoint probing
+"""
+
+import json
+import time
+
+ARTIFACT_FORMAT = 'ecosage-model'
+ARTIFACT_VERSION = 1
+ARTIFACT_PATH = "waste_classifier_model_v2.ecosage"
+
+
+def save_model_artifact(model, path, metadata):
+    """
+    Write an optimized model and its metadata to a single file
+
+    Args:
+        model (torch.jit.ScriptModule): Frozen TorchScript model
+        path (str): Output file
+        metadata (dict): Classes, preprocessing and provenance details
+    """
+    import torch
+
+    metadata = dict(metadata, format=ARTIFACT_FORMAT, version=ARTIFACT_VERSION, created_at=time.time())
+    torch.jit.save(model, path, _extra_files={'metadata.json': json.dumps(metadata)})
+
+
+def load_model_artifact(path, device='cpu'):
+    """
+    Load an artifact written by save_model_artifact
+
+    Returns:
+        tuple: (torch.jit.ScriptModule, metadata dict)
+    """
+    import torch
+
+    extra_files = {'metadata.json': ''}
+    model = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+    metadata = json.loads(extra_files['metadata.json'] or '{}')
+
+    if metadata.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not an EcoSage model artifact")
+    if metadata.get('version', 0) > ARTIFACT_VERSION:
+        raise ValueError(f"{path} uses artifact version {metadata['version']}, this server supports {ARTIFACT_VERSION}")
+
+    model.eval()
+    return model, metadata
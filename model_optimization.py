@@ -0,0 +1,107 @@
+"""
+Inference-time optimizations for the EcoSage waste classifier
+Conv+BatchNorm folding, channels_last layout, TorchScript / torch.compile
+graphs, applied to an already trained eval-mode model
+"""
+
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+OPTIMIZE_MODES = ['off', 'fuse', 'trace', 'script', 'compile']
+
+
+def fuse_conv_bn(model):
+    """
+    Fold every BatchNorm that directly follows a convolution into that convolution
+    Covers torchvision ResNets (conv1/bn1, convN/bnN and the downsample
+    Sequential). The model must be in eval mode; it is modified in place
+    """
+    for module in list(model.modules()):
+        # convN followed by bnN attributes (stem and residual blocks)
+        for name, child in list(module.named_children()):
+            if isinstance(child, nn.Conv2d) and name.startswith('conv'):
+                bn_name = 'bn' + name[len('conv'):]
+                bn = getattr(module, bn_name, None)
+                if isinstance(bn, nn.BatchNorm2d):
+                    setattr(module, name, fuse_conv_bn_eval(child, bn))
+                    setattr(module, bn_name, nn.Identity())
+
+        # Conv2d immediately followed by BatchNorm2d inside a Sequential
+        if isinstance(module, nn.Sequential):
+            for index in range(len(module) - 1):
+                conv, bn = module[index], module[index + 1]
+                if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+                    module[index] = fuse_conv_bn_eval(conv, bn)
+                    module[index + 1] = nn.Identity()
+    return model
+
+
+def optimize_for_inference(model, mode='trace', channels_last=True, device='cpu'):
+    """
+    Build an optimized inference graph from an eval-mode model
+
+    Args:
+        model (torch.nn.Module): Trained model in eval mode
+        mode (str): 'fuse' (Conv+BN folding only), 'trace' or 'script'
+            (frozen TorchScript) or 'compile' (torch.compile, if available)
+        channels_last (bool): Store weights and expect inputs in NHWC layout
+        device (str): Device the model lives on
+
+    Returns:
+        Callable model with the same inputs and outputs
+    """
+    if mode not in OPTIMIZE_MODES:
+        raise ValueError(f"Unknown optimization mode: {mode}")
+    if mode == 'off':
+        return model
+
+    model.eval()
+    fuse_conv_bn(model)
+
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    model = model.to(device=device, memory_format=memory_format)
+
+    if mode == 'trace':
+        example = torch.randn(1, 3, 224, 224, device=device).contiguous(memory_format=memory_format)
+        with torch.no_grad():
+            model = torch.jit.freeze(torch.jit.trace(model, example))
+    elif mode == 'script':
+        model = torch.jit.freeze(torch.jit.script(model))
+    elif mode == 'compile':
+        if hasattr(torch, 'compile'):
+            model = torch.compile(model, dynamic=True)
+        else:
+            print("⚠️ torch.compile is not available in this PyTorch version, using fused eager model")
+    return model
+
+
+def quantize_static_int8(model, calibration_batches, backend='x86'):
+    """
+    Post-training static INT8 quantization (FX graph mode)
+
+    Args:
+        model (torch.nn.Module): Trained fp32 model in eval mode (left untouched)
+        calibration_batches (iterable): (N, 3, 224, 224) float tensors used to
+            observe activation ranges, preprocessed exactly like served images
+        backend (str): Quantized kernel backend, 'x86' or 'fbgemm' for servers,
+            'qnnpack' for ARM
+
+    Returns:
+        torch.jit.ScriptModule: Frozen TorchScript INT8 model, ready for torch.jit.save
+    """
+    import copy
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = backend
+    example = torch.randn(1, 3, 224, 224)
+
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(backend), example_inputs=(example,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+        quantized = convert_fx(prepared)
+        # TorchScript keeps the quantized graph loadable without re-running prepare_fx
+        return torch.jit.freeze(torch.jit.trace(quantized, example))
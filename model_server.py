@@ -1,12 +1,19 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import torch
-import torch.nn.functional as F
-from torchvision import transforms
 from PIL import Image
+import numpy as np
 import io
 import os
-# Model loading handled directly in the class
+import base64
+import threading
+from micro_batcher import MicroBatcher, warmup_batch_sizes
+from preprocessing import PreprocessPool, TTA_VIEWS
+from binary_batch import BATCH_CONTENT_TYPE, unpack_images
+from debug_capture import DebugCapture
+from prediction_cache import PredictionCache, NearDuplicateCache, image_hash
+from inference_backends import TorchBackend, OnnxRuntimeBackend, ONNX_MODEL_PATH, warmup
+# Model loading handled directly in the class. torch, torchvision and the model
+# helpers are imported there too, so /health can answer before they are loaded
 
 app = Flask(__name__)
 CORS(app)
@@ -14,19 +21,101 @@ CORS(app)
 class WasteClassifierServer:
     def __init__(self):
         self.model = None
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model_version = None
+        self.device = None
+        self.ready = threading.Event()
         self.classes = ['cardboard', 'glass', 'metal', 'paper', 'plastic', 'trash']
         
-        # Define transforms (same as training)
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                               std=[0.229, 0.224, 0.225])
-        ])
+        # Decode + Resize/ToTensor/Normalize (same as training) run in a worker pool
+        # that hands ready arrays to the inference stage. PREPROCESS_MODE=process
+        # moves the work out of this interpreter entirely, DECODE_MODE=draft decodes
+        # JPEGs at a reduced scale (check with check_draft_parity.py)
+        self.preprocess_pool = PreprocessPool(
+            mode=os.getenv('PREPROCESS_MODE', 'thread'),
+            workers=int(os.getenv('PREPROCESS_WORKERS', str(os.cpu_count() or 4))),
+            draft=os.getenv('DECODE_MODE', 'full') == 'draft',
+            perceptual_hash=os.getenv('NEAR_DUPLICATE_CACHE', '0') == '1'
+        )
+        
+        # Results of recently seen images, keyed by a hash of the raw bytes.
+        # PREDICTION_CACHE_SIZE=0 turns it off
+        self.cache = None
+        if int(os.getenv('PREDICTION_CACHE_SIZE', '10000')) > 0:
+            self.cache = PredictionCache(
+                max_entries=int(os.getenv('PREDICTION_CACHE_SIZE', '10000')),
+                ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL', '3600')),
+                disk_dir=os.getenv('PREDICTION_CACHE_DIR') or None
+            )
+        
+        # Optional lookup of earlier photos of the same item (re-framed or re-encoded)
+        # by perceptual hash, served when within NEAR_DUPLICATE_MAX_DISTANCE bits
+        self.near_cache = None
+        if self.preprocess_pool.perceptual_hash:
+            self.near_cache = NearDuplicateCache(
+                max_distance=int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', '4')),
+                max_entries=int(os.getenv('NEAR_DUPLICATE_CACHE_SIZE', '100000'))
+            )
+        
+        # MODEL_OPTIMIZE=fuse|trace|script|compile folds Conv+BN into one op, switches
+        # to channels_last and builds a TorchScript/compiled graph at load time
+        self.optimize_mode = os.getenv('MODEL_OPTIMIZE', 'off')
+        self.channels_last = self.optimize_mode != 'off' and os.getenv('MODEL_CHANNELS_LAST', '1') == '1'
+        
+        # TTA_ENABLED=1 re-scores predictions below TTA_THRESHOLD confidence with augmented
+        # views (TTA_VIEWS) in one extra batched pass and averages the softmax outputs
+        self.tta_threshold = float(os.getenv('TTA_THRESHOLD', '0.6'))
+        self.tta_views = []
+        if os.getenv('TTA_ENABLED', '0') == '1':
+            self.tta_views = [view.strip() for view in os.getenv('TTA_VIEWS', 'flip,center,top_left,bottom_right').split(',') if view.strip()]
+            unknown = [view for view in self.tta_views if view not in TTA_VIEWS]
+            if unknown:
+                raise ValueError(f"Unknown TTA views {unknown}, choose from {TTA_VIEWS}")
+        
+        # MODEL_PRECISION=int8 serves the quantized model from quantize_model.py (CPU only)
+        self.precision = os.getenv('MODEL_PRECISION', 'fp32')
+        
+        # INFERENCE_BACKEND=onnx serves the export_onnx.py model through ONNX Runtime
+        self.backend_name = os.getenv('INFERENCE_BACKEND', 'torch')
+        
+        # MODEL_ARTIFACT=<path> loads a build_model_artifact.py file instead of probing checkpoints
+        self.artifact_path = os.getenv('MODEL_ARTIFACT')
+        
+        # MODEL_WEIGHTS=<path> maps a build_model_artifact.py --format mmap file read-only,
+        # so every server process on the node shares one copy of the weights
+        self.weights_path = os.getenv('MODEL_WEIGHTS')
+        self.batcher = None
+        
+        # BACKGROUND_LOAD=1 starts serving /health right away and loads the model on a
+        # background thread; /ready reports when predictions can be served
+        if os.getenv('BACKGROUND_LOAD', '0') == '1':
+            threading.Thread(target=self.initialize, name='model-loader', daemon=True).start()
+        else:
+            self.initialize()
+    
+    def initialize(self):
+        """Load and warm up the model, then start the batcher and mark the server ready"""
+        self.max_batch_size = int(os.getenv('BATCH_MAX_SIZE', '8'))
         
         # Load model
         self.load_model()
+        
+        # CASCADE_ENABLED=1 puts a cheap first stage (CASCADE_FIRST_STAGE) in front of the
+        # loaded model; only images it is unsure about reach the full model
+        if self.model is not None and os.getenv('CASCADE_ENABLED', '0') == '1':
+            self.load_cascade()
+        
+        # Dynamic micro-batching: requests arriving within BATCH_MAX_WAIT_MS of each
+        # other share a single forward pass on one worker thread
+        if self.model is not None and os.getenv('BATCHING_ENABLED', '1') == '1':
+            self.batcher = MicroBatcher(
+                self.predict_batch,
+                max_batch_size=self.max_batch_size,
+                max_wait_ms=float(os.getenv('BATCH_MAX_WAIT_MS', '5'))
+            )
+            print(f"📦 Micro-batching enabled (max batch {self.batcher.max_batch_size}, "
+                  f"window {self.batcher.max_wait * 1000:.1f} ms)")
+        
+        self.ready.set()
     
     def create_model_architecture(self):
         """Create the same model architecture used during training"""
@@ -39,52 +128,46 @@ class WasteClassifierServer:
         return model
     
     def load_model(self):
+        if self.backend_name == 'onnx' and self.load_onnx_model():
+            return
+        
+        import torch
+        
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        
+        # Optional cap on intra-op threads so inference doesn't oversubscribe the CPU
+        if os.getenv('TORCH_NUM_THREADS'):
+            torch.set_num_threads(int(os.getenv('TORCH_NUM_THREADS')))
+        
+        if self.artifact_path and self.load_artifact():
+            return
+        if self.weights_path and self.load_shared_weights():
+            return
+        if self.precision == 'int8' and self.load_int8_model():
+            return
+        
+        from model_architecture import MODEL_PATHS, load_checkpoint_model
+        
+        # MODEL_PATH picks a specific checkpoint, e.g. a distilled student
+        model_paths = [os.getenv('MODEL_PATH')] + MODEL_PATHS if os.getenv('MODEL_PATH') else MODEL_PATHS
+        
         try:
-            import torch.nn as nn
-            from torchvision import models
-            
             # Try to find your trained model
-            model_paths = [
-                "waste_classifier_model_v2.pth",
-                "waste_classifier_model.pth",
-                "backend/waste_classifier_model_v2.pth",
-                "backend/waste_classifier_model.pth"
-            ]
-            
             for model_path in model_paths:
                 if os.path.exists(model_path):
                     try:
                         print(f"🔍 Found model at: {model_path}")
                         
-                        # Load checkpoint
-                        checkpoint = torch.load(model_path, map_location=self.device)
-                        
-                        # Try different architectures based on the keys in the checkpoint
-                        if 'fc.1.weight' in checkpoint:
-                            # v2 model has Sequential final layer: fc = nn.Sequential(nn.Dropout(), nn.Linear(...))
-                            print("🔧 Detected v2 model architecture with Sequential final layer")
-                            model = models.resnet18(pretrained=False)
-                            model.fc = nn.Sequential(
-                                nn.Dropout(0.5),
-                                nn.Linear(model.fc.in_features, 6)
-                            )
-                        elif 'fc.weight' in checkpoint:
-                            # v1 model has simple Linear final layer
-                            print("🔧 Detected v1 model architecture with Linear final layer")  
-                            model = models.resnet18(pretrained=False)
-                            model.fc = nn.Linear(model.fc.in_features, 6)
-                        else:
-                            print("⚠️ Unknown model structure, trying default ResNet18")
-                            model = models.resnet18(pretrained=False)
-                            model.fc = nn.Linear(model.fc.in_features, 6)
+                        # Plain state dicts are matched by their keys, self-describing
+                        # checkpoints carry their own architecture and classes
+                        model, info = load_checkpoint_model(model_path, self.device)
+                        if info.get('classes'):
+                            self.classes = info['classes']
+                        model = self.optimize_model(model)
                         
-                        # Load state dict
-                        model.load_state_dict(checkpoint)
-                        model.eval()
-                        model.to(self.device)
-                        
-                        self.model = model
-                        print(f"✅ Successfully loaded trained ResNet18 from {model_path}")
+                        self.model = self.warm_up(TorchBackend(model, self.device, self.channels_last))
+                        self.on_model_changed(f"{model_path}@{os.path.getmtime(model_path):.0f}")
+                        print(f"✅ Successfully loaded trained {info.get('arch', 'ResNet18')} from {model_path}")
                         return
                         
                     except Exception as e:
@@ -99,172 +182,448 @@ class WasteClassifierServer:
             print("⚠️ Falling back to demo mode")
             self.model = None
     
-    def predict(self, image_bytes):
-        # Import all needed modules at the top
-        import random
-        import io
-        from PIL import Image
-        import numpy as np
+    def load_artifact(self):
+        """Load a pre-optimized artifact, returns False to fall back to checkpoint probing"""
+        from model_artifact import load_model_artifact
         
-        if self.model is None:
-            # Smarter demo predictions based on simple image analysis
-            
-            try:
-                # Analyze image for basic properties
-                image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-                
-                # Get average color
-                img_array = np.array(image.resize((64, 64)))
-                avg_color = np.mean(img_array, axis=(0, 1))
-                
-                # Simple heuristics based on color
-                predictions = {
-                    "cardboard": 0.1,
-                    "glass": 0.1, 
-                    "metal": 0.1,
-                    "paper": 0.1,
-                    "plastic": 0.1,
-                    "trash": 0.1
-                }
-                
-                # Color-based predictions (very basic)
-                if avg_color[1] > avg_color[0] and avg_color[1] > avg_color[2]:  # Green-ish
-                    predictions["glass"] = 0.7
-                elif avg_color[2] > 150:  # Blue-ish
-                    predictions["plastic"] = 0.6
-                elif avg_color[0] > 200 and avg_color[1] > 200 and avg_color[2] > 200:  # White-ish
-                    predictions["paper"] = 0.5
-                elif avg_color[0] > 150 and avg_color[1] < 100:  # Red-ish/brown
-                    predictions["cardboard"] = 0.6
-                elif sum(avg_color) < 300:  # Dark
-                    predictions["metal"] = 0.5
-                else:
-                    predictions["plastic"] = 0.4
-                
-                # Add some randomness
-                for key in predictions:
-                    predictions[key] += random.uniform(-0.1, 0.1)
-                    predictions[key] = max(0.05, min(0.9, predictions[key]))
-                
-            except Exception as e:
-                print(f"Demo prediction error: {e}")
-                predictions = {
-                    "cardboard": random.uniform(0.1, 0.3),
-                    "glass": random.uniform(0.1, 0.8),  # Higher chance for glass
-                    "metal": random.uniform(0.1, 0.3),
-                    "paper": random.uniform(0.1, 0.3),
-                    "plastic": random.uniform(0.1, 0.6),
-                    "trash": random.uniform(0.1, 0.3)
-                }
+        model_path = self.artifact_path
+        if not os.path.exists(model_path):
+            print(f"⚠️ Model artifact not found at {model_path} (run build_model_artifact.py)")
+            return False
+        
+        try:
+            model, metadata = load_model_artifact(model_path, self.device)
+            self.classes = metadata.get('classes', self.classes)
+            self.channels_last = metadata.get('channels_last', False)
             
-            # Normalize to sum to 1
-            total = sum(predictions.values())
-            predictions = {k: v/total for k, v in predictions.items()}
+            self.model = self.warm_up(TorchBackend(model, self.device, self.channels_last))
+            self.on_model_changed(f"{model_path}@{os.path.getmtime(model_path):.0f}")
+            print(f"✅ Successfully loaded {metadata.get('arch', 'model')} artifact from {model_path}")
+            return True
+        except Exception as e:
+            print(f"❌ Failed to load model artifact {model_path}: {e}")
+            return False
+    
+    def load_shared_weights(self):
+        """Serve a memory-mapped weight file, returns False to fall back to checkpoint probing"""
+        from model_architecture import load_shared_classifier
+        
+        model_path = self.weights_path
+        if not os.path.exists(model_path):
+            print(f"⚠️ Shared weight file not found at {model_path} (run build_model_artifact.py --format mmap)")
+            return False
+        if self.device.type != 'cpu':
+            # Copying to the GPU would defeat the shared mapping
+            print("⚠️ Shared weights are mapped into CPU memory, using the checkpoint on GPU")
+            return False
+        
+        try:
+            # Weights are already folded and laid out; MODEL_OPTIMIZE would copy them
+            model, metadata = load_shared_classifier(model_path)
+            self.classes = metadata.get('classes', self.classes)
+            self.channels_last = metadata.get('channels_last', False)
             
-            # Get top prediction
-            best_class = max(predictions, key=predictions.get)
-            confidence = predictions[best_class]
+            self.model = self.warm_up(TorchBackend(model, self.device, self.channels_last))
+            self.on_model_changed(f"{model_path}@{os.path.getmtime(model_path):.0f}")
+            print(f"✅ Successfully mapped shared weights from {model_path}")
+            return True
+        except Exception as e:
+            print(f"❌ Failed to map shared weights {model_path}: {e}")
+            return False
+    
+    def load_int8_model(self):
+        """Load the INT8 TorchScript model, returns False to fall back to fp32"""
+        from model_architecture import INT8_MODEL_PATH, load_quantized_classifier
+        
+        model_path = os.getenv('INT8_MODEL_PATH', INT8_MODEL_PATH)
+        if not os.path.exists(model_path):
+            print(f"⚠️ INT8 model not found at {model_path} (run quantize_model.py), using fp32")
+            return False
+        if self.device.type != 'cpu':
+            print("⚠️ INT8 model only runs on CPU, using fp32")
+            return False
+        
+        try:
+            model = load_quantized_classifier(model_path, backend=os.getenv('QUANTIZED_ENGINE', 'x86'))
             
-            return {
-                "prediction": best_class,
-                "confidence": float(confidence),
-                "all_predictions": predictions,
-                "mode": "demo",
-                "environmental_impact": self.get_environmental_impact(best_class),
-                "suggestions": self.get_suggestions(best_class)
-            }
+            # Already a frozen TorchScript graph with its own memory layout
+            self.channels_last = False
+            self.model = self.warm_up(TorchBackend(model))
+            self.on_model_changed(f"{model_path}@{os.path.getmtime(model_path):.0f}")
+            print(f"✅ Successfully loaded INT8 ResNet18 from {model_path}")
+            return True
+        except Exception as e:
+            print(f"❌ Failed to load INT8 model {model_path}: {e}")
+            return False
+    
+    def load_onnx_model(self):
+        """Serve the ONNX export through ONNX Runtime, returns False to fall back to PyTorch"""
+        model_path = os.getenv('ONNX_MODEL_PATH', ONNX_MODEL_PATH)
+        if not os.path.exists(model_path):
+            print(f"⚠️ ONNX model not found at {model_path} (run export_onnx.py), using PyTorch")
+            return False
+        
+        try:
+            backend = OnnxRuntimeBackend(model_path, intra_op_threads=int(os.getenv('ORT_NUM_THREADS', '0')))
+            self.model = self.warm_up(backend)
+            self.device = 'cpu'
+            self.on_model_changed(f"{model_path}@{os.path.getmtime(model_path):.0f}")
+            print(f"✅ Successfully loaded ONNX model from {model_path}")
+            return True
+        except Exception as e:
+            print(f"❌ Failed to load ONNX model {model_path}: {e}")
+            return False
+    
+    def load_cascade(self):
+        """Wrap the loaded model in a confidence-gated cascade, keeps the model on failure"""
+        from cascade import CALIBRATION_PATH, CascadeBackend, calibrated_threshold, load_stage_backend
+        
+        spec = os.getenv('CASCADE_FIRST_STAGE', 'int8')
+        
+        try:
+            # A malformed calibration file, or one measured for another first stage,
+            # leaves the full model serving, like a bad first stage
+            if os.getenv('CASCADE_THRESHOLD'):
+                threshold = float(os.getenv('CASCADE_THRESHOLD'))
+            else:
+                threshold = calibrated_threshold(os.getenv('CASCADE_CALIBRATION', CALIBRATION_PATH), first_stage=spec)
+            first_stage = self.warm_up(load_stage_backend(spec, self.device or 'cpu'))
+        except Exception as e:
+            print(f"❌ Failed to set up cascade with first stage {spec}: {e}")
+            print("⚠️ Serving the full model for every image")
+            return
+        
+        self.model = CascadeBackend(first_stage, self.model, threshold)
+        self.on_model_changed(f"{self.model_version}+cascade:{spec}@{threshold:.3f}")
+        print(f"🪜 Cascade enabled: {spec} first, full model below {threshold:.3f} confidence")
+    
+    def optimize_model(self, model):
+        """Apply MODEL_OPTIMIZE to a freshly loaded checkpoint"""
+        if self.optimize_mode == 'off':
+            return model
+        
+        from model_optimization import optimize_for_inference
+        
+        print(f"⚙️ Optimizing model for inference (mode: {self.optimize_mode}, channels_last: {self.channels_last})")
+        return optimize_for_inference(model, self.optimize_mode, self.channels_last, self.device)
+    
+    def warm_up(self, backend):
+        """Run every batch size the batcher can form through a backend before it serves"""
+        name = getattr(backend, 'name', 'model')
+        for batch_size, ms in warmup(backend, warmup_batch_sizes(self.max_batch_size)).items():
+            print(f"🔥 Warmup {name} batch {batch_size}: {ms:.1f} ms")
+        return backend
+    
+    def serving_settings(self):
+        """Settings besides the model that change predictions, part of the cache version"""
+        decode = 'draft' if self.preprocess_pool.draft else 'full'
+        tta = f"{','.join(self.tta_views)}@{self.tta_threshold}" if self.tta_views else 'off'
+        return f"decode:{decode}+tta:{tta}"
+    
+    def on_model_changed(self, model_version):
+        """Forget cached results that were produced by a previous model or other settings"""
+        self.model_version = model_version
+        if self.cache is not None:
+            # Results on disk from a run with another DECODE_MODE or TTA setup are not reused
+            self.cache.invalidate(f"{model_version}+{self.serving_settings()}")
+        if self.near_cache is not None:
+            self.near_cache.invalidate()
+    
+    def predict(self, image_bytes):
+        if self.model is None:
+            return self.demo_predict(image_bytes)
+        
+        # Repeat uploads are answered before anything is decoded
+        cache_key = None
+        if self.cache is not None:
+            cache_key = image_hash(image_bytes)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return dict(cached, cached=True)
         
         try:
             # Real model prediction - simplified approach
             print(f"📸 Processing image data of size: {len(image_bytes)} bytes")
             
-            # Try direct PIL loading first
-            try:
-                from PIL import Image
-                import io
-                
-                # Method 1: Direct BytesIO approach
-                image_buffer = io.BytesIO(image_bytes)
-                image_buffer.seek(0)
-                image = Image.open(image_buffer)
-                image = image.convert('RGB')
-                print(f"✅ Method 1 success: {image.format}, {image.size}")
-                
-            except Exception as e1:
-                print(f"⚠️ Method 1 failed: {e1}")
-                
-                try:
-                    # Method 2: Save to temp file and reload
-                    import tempfile
-                    import os
-                    
-                    # Try different extensions
-                    for ext in ['.jpg', '.png', '.jpeg', '.bmp']:
-                        try:
-                            with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as temp_file:
-                                temp_file.write(image_bytes)
-                                temp_file_path = temp_file.name
-                            
-                            image = Image.open(temp_file_path)
-                            image = image.convert('RGB') 
-                            print(f"✅ Method 2 success with {ext}: {image.size}")
-                            
-                            # Clean up
-                            try:
-                                os.unlink(temp_file_path)
-                            except:
-                                pass
-                            break
-                            
-                        except Exception as ext_error:
-                            print(f"⚠️ Extension {ext} failed: {ext_error}")
-                            try:
-                                os.unlink(temp_file_path)
-                            except:
-                                pass
-                            continue
-                    else:
-                        raise Exception("All image loading methods failed")
-                        
-                except Exception as e2:
-                    print(f"❌ Method 2 also failed: {e2}")
-                    raise Exception("Cannot load image with any method")
+            image_array, perceptual_hash = self.preprocess(image_bytes)
+            print(f"🧠 Input tensor shape: {image_array.shape}")
             
-            # Apply transforms and predict
-            image_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            print(f"🧠 Input tensor shape: {image_tensor.shape}")
+            result = self.near_duplicate_result(perceptual_hash)
+            if result is None:
+                probabilities = self.run_inference(image_array)
+                probabilities, tta = self.apply_tta(image_array, probabilities)
+                result = self.format_prediction(probabilities[0], tta[0])
+                print(f"🎯 Prediction: {result['prediction']} ({result['confidence']:.3f})")
+                if perceptual_hash is not None:
+                    self.near_cache.put(perceptual_hash, result)
             
-            with torch.no_grad():
-                outputs = self.model(image_tensor)
-                predictions = F.softmax(outputs, dim=1)
-                confidence, predicted_class = torch.max(predictions, 1)
-                
-                class_name = self.classes[predicted_class.item()]
-                confidence_score = float(confidence.item())
-                
-                print(f"🎯 Prediction: {class_name} ({confidence_score:.3f})")
-                
-                all_preds = {
-                    self.classes[i]: float(predictions[0][i].item()) 
-                    for i in range(len(self.classes))
-                }
-                
-                return {
-                    "prediction": class_name,
-                    "confidence": confidence_score,
-                    "all_predictions": all_preds,
-                    "mode": "real",
-                    "environmental_impact": self.get_environmental_impact(class_name),
-                    "suggestions": self.get_suggestions(class_name)
-                }
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
+            return result
                 
         except Exception as e:
             print(f"Prediction error: {e}")
-            return {
-                "error": str(e),
-                "prediction": "unknown",
-                "confidence": 0.0
+            return self.error_result(e)
+    
+    def predict_many(self, images):
+        """
+        Classify several images with a single forward pass
+        
+        Args:
+            images (list): Raw image bytes, one entry per image
+            
+        Returns:
+            list: One result dict per image, in input order
+        """
+        if self.model is None:
+            return [self.demo_predict(image_bytes) for image_bytes in images]
+        
+        print(f"📸 Processing batch of {len(images)} images")
+        
+        results = [None] * len(images)
+        cache_keys = [None] * len(images)
+        pending = []
+        for index, image_bytes in enumerate(images):
+            if self.cache is not None:
+                cache_keys[index] = image_hash(image_bytes)
+                cached = self.cache.get(cache_keys[index])
+                if cached is not None:
+                    results[index] = dict(cached, cached=True)
+                    continue
+            pending.append(index)
+        
+        # Decode and preprocess the remaining images in parallel on the preprocessing pool
+        arrays = self.preprocess_pool.map([images[index] for index in pending])
+        
+        decoded = []
+        for index, output in zip(pending, arrays):
+            if isinstance(output, Exception):
+                print(f"Preprocessing error: {output}")
+                results[index] = self.error_result(output)
+                continue
+            array, perceptual_hash = output
+            results[index] = self.near_duplicate_result(perceptual_hash)
+            if results[index] is None:
+                decoded.append((index, array, perceptual_hash))
+            elif cache_keys[index] is not None:
+                self.cache.put(cache_keys[index], results[index])
+        
+        if decoded:
+            try:
+                batch = np.stack([array for _, array, _ in decoded])
+                probabilities = self.run_inference(batch)
+                probabilities, tta = self.apply_tta(batch, probabilities)
+                for row, (index, _, perceptual_hash) in enumerate(decoded):
+                    results[index] = self.format_prediction(probabilities[row], tta[row])
+                    if cache_keys[index] is not None:
+                        self.cache.put(cache_keys[index], results[index])
+                    if perceptual_hash is not None:
+                        self.near_cache.put(perceptual_hash, results[index])
+            except Exception as e:
+                print(f"Batch prediction error: {e}")
+                for index, _, _ in decoded:
+                    results[index] = self.error_result(e)
+        
+        return results
+    
+    def preprocess(self, image_bytes):
+        """
+        Decode image bytes into a normalized (1, 3, 224, 224) float32 array
+        
+        Returns:
+            tuple: (array, perceptual hash or None)
+        """
+        array, perceptual_hash = self.preprocess_pool.run(image_bytes)
+        return array[np.newaxis], perceptual_hash
+    
+    def near_duplicate_result(self, perceptual_hash):
+        """Stored result for a near-identical earlier photo, or None"""
+        if perceptual_hash is None:
+            return None
+        match = self.near_cache.get(perceptual_hash)
+        if match is None:
+            return None
+        distance, result = match
+        return dict(result, near_duplicate=True, hash_distance=distance)
+    
+    def run_inference(self, image_array):
+        """Return softmax probabilities for an (N, 3, 224, 224) array"""
+        # Large requests go through in chunks of at most BATCH_MAX_SIZE images,
+        # the largest forward pass the model was warmed up and sized for
+        chunks = [image_array[start:start + self.max_batch_size]
+                  for start in range(0, len(image_array), self.max_batch_size)]
+        if self.batcher is not None:
+            # Submitted together, so chunks share forward passes with other requests
+            futures = [self.batcher.submit(chunk) for chunk in chunks]
+            return np.concatenate([future.result() for future in futures], axis=0)
+        return np.concatenate([self.predict_batch([chunk])[0] for chunk in chunks], axis=0)
+    
+    def apply_tta(self, arrays, probabilities):
+        """
+        Re-score low-confidence predictions with test-time augmentation
+        
+        The augmented views of every image under TTA_THRESHOLD are built from its
+        preprocessed input and go through the batcher together, in chunks of at
+        most BATCH_MAX_SIZE images; each image's views are averaged with its
+        original prediction
+        
+        Args:
+            arrays (np.ndarray): (N, 3, 224, 224) preprocessed inputs, one per probabilities row
+            probabilities (np.ndarray): (N, num_classes) softmax outputs
+            
+        Returns:
+            tuple: (updated probabilities, list of TTA details or None per image)
+        """
+        details = [None] * len(arrays)
+        if not self.tta_views:
+            return probabilities, details
+        
+        low = [row for row in range(len(arrays)) if probabilities[row].max() < self.tta_threshold]
+        if not low:
+            return probabilities, details
+        
+        futures = [(row, self.preprocess_pool.submit_tta(arrays[row], self.tta_views)) for row in low]
+        rows, views = [], []
+        for row, future in futures:
+            try:
+                views.append(future.result())
+                rows.append(row)
+            except Exception as e:
+                print(f"⚠️ TTA preprocessing failed, keeping the single-view prediction: {e}")
+        if not rows:
+            return probabilities, details
+        
+        try:
+            view_probabilities = self.run_inference(np.concatenate(views))
+        except Exception as e:
+            print(f"⚠️ TTA inference failed, keeping the single-view prediction: {e}")
+            return probabilities, details
+        
+        probabilities = probabilities.copy()
+        count = len(self.tta_views)
+        for position, row in enumerate(rows):
+            stacked = view_probabilities[position * count:(position + 1) * count]
+            details[row] = {"views": count + 1, "initial_confidence": float(probabilities[row].max())}
+            probabilities[row] = (probabilities[row] + stacked.sum(axis=0)) / (count + 1)
+        print(f"🔁 TTA re-scored {len(rows)} low-confidence image(s) with {count} extra views each")
+        return probabilities, details
+    
+    def error_result(self, error):
+        return {
+            "error": str(error),
+            "prediction": "unknown",
+            "confidence": 0.0
+        }
+    
+    def predict_batch(self, image_arrays):
+        """
+        Run one forward pass over a list of image batches
+        
+        Args:
+            image_arrays (list): Arrays shaped (N, 3, 224, 224), N may differ per entry
+            
+        Returns:
+            list: Softmax probabilities, one (N, num_classes) array per entry
+        """
+        sizes = [a.shape[0] for a in image_arrays]
+        batch = np.concatenate(image_arrays, axis=0)
+        predictions = self.model.predict(batch)
+        return np.split(predictions, np.cumsum(sizes)[:-1], axis=0)
+    
+    def format_prediction(self, probabilities, tta=None):
+        """Build the response for one image from its softmax probabilities"""
+        predicted_class = int(np.argmax(probabilities))
+        
+        class_name = self.classes[predicted_class]
+        confidence_score = float(probabilities[predicted_class])
+        
+        all_preds = {
+            self.classes[i]: float(probabilities[i]) 
+            for i in range(len(self.classes))
+        }
+        
+        result = {
+            "prediction": class_name,
+            "confidence": confidence_score,
+            "all_predictions": all_preds,
+            "mode": "real",
+            "environmental_impact": self.get_environmental_impact(class_name),
+            "suggestions": self.get_suggestions(class_name)
+        }
+        if tta:
+            result["tta"] = tta
+        return result
+    
+    def demo_predict(self, image_bytes):
+        # Import all needed modules at the top
+        import random
+        
+        # Smarter demo predictions based on simple image analysis
+        
+        try:
+            # Analyze image for basic properties
+            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+            
+            # Get average color
+            img_array = np.array(image.resize((64, 64)))
+            avg_color = np.mean(img_array, axis=(0, 1))
+            
+            # Simple heuristics based on color
+            predictions = {
+                "cardboard": 0.1,
+                "glass": 0.1, 
+                "metal": 0.1,
+                "paper": 0.1,
+                "plastic": 0.1,
+                "trash": 0.1
+            }
+            
+            # Color-based predictions (very basic)
+            if avg_color[1] > avg_color[0] and avg_color[1] > avg_color[2]:  # Green-ish
+                predictions["glass"] = 0.7
+            elif avg_color[2] > 150:  # Blue-ish
+                predictions["plastic"] = 0.6
+            elif avg_color[0] > 200 and avg_color[1] > 200 and avg_color[2] > 200:  # White-ish
+                predictions["paper"] = 0.5
+            elif avg_color[0] > 150 and avg_color[1] < 100:  # Red-ish/brown
+                predictions["cardboard"] = 0.6
+            elif sum(avg_color) < 300:  # Dark
+                predictions["metal"] = 0.5
+            else:
+                predictions["plastic"] = 0.4
+            
+            # Add some randomness
+            for key in predictions:
+                predictions[key] += random.uniform(-0.1, 0.1)
+                predictions[key] = max(0.05, min(0.9, predictions[key]))
+            
+        except Exception as e:
+            print(f"Demo prediction error: {e}")
+            predictions = {
+                "cardboard": random.uniform(0.1, 0.3),
+                "glass": random.uniform(0.1, 0.8),  # Higher chance for glass
+                "metal": random.uniform(0.1, 0.3),
+                "paper": random.uniform(0.1, 0.3),
+                "plastic": random.uniform(0.1, 0.6),
+                "trash": random.uniform(0.1, 0.3)
             }
+        
+        # Normalize to sum to 1
+        total = sum(predictions.values())
+        predictions = {k: v/total for k, v in predictions.items()}
+        
+        # Get top prediction
+        best_class = max(predictions, key=predictions.get)
+        confidence = predictions[best_class]
+        
+        return {
+            "prediction": best_class,
+            "confidence": float(confidence),
+            "all_predictions": predictions,
+            "mode": "demo",
+            "environmental_impact": self.get_environmental_impact(best_class),
+            "suggestions": self.get_suggestions(best_class)
+        }
     
     def get_environmental_impact(self, waste_type):
         impacts = {
@@ -288,40 +647,76 @@ class WasteClassifierServer:
         }
         return suggestions.get(waste_type, ["Dispose of responsibly"])
 
-# Initialize classifier
-classifier = WasteClassifierServer()
+# Initialize classifier (skipped when spawned preprocessing workers re-import this module)
+classifier = WasteClassifierServer() if __name__ != '__mp_main__' else None
+
+# DEBUG_CAPTURE_RATE=0.01 keeps a sampled ring of request images (and their predictions)
+# in DEBUG_CAPTURE_DIR, written by a background thread off the request path
+if classifier is not None and float(os.getenv('DEBUG_CAPTURE_RATE', '0')) > 0:
+    debug_capture = DebugCapture(
+        directory=os.getenv('DEBUG_CAPTURE_DIR', 'debug_captures'),
+        sample_rate=float(os.getenv('DEBUG_CAPTURE_RATE')),
+        max_files=int(os.getenv('DEBUG_CAPTURE_MAX_FILES', '100')),
+        max_queue=int(os.getenv('DEBUG_CAPTURE_QUEUE', '32'))
+    )
+else:
+    debug_capture = None
+
+def predict_and_capture(image_bytes):
+    """Classify one image and hand it to the debug capture sampler"""
+    result = classifier.predict(image_bytes)
+    if debug_capture:
+        debug_capture.capture(image_bytes, result)
+    return result
+
+def decode_base64_image(image_data):
+    """Decode a base64 string, with or without a data URL prefix, into bytes"""
+    if image_data.startswith('data:image'):
+        image_data = image_data.split(',')[1]
+    return base64.b64decode(image_data)
+
+def is_binary_upload(req):
+    """True when the request body is a raw image rather than JSON or a form"""
+    return req.mimetype == 'application/octet-stream' or req.mimetype.startswith('image/')
+
+def not_ready_response():
+    """503 for prediction requests that arrive while the model is still loading"""
+    response = jsonify({"error": "Model is still loading", "ready": False})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @app.route('/predictions/waste_classifier', methods=['POST'])
 def predict():
+    if not classifier.ready.is_set():
+        return not_ready_response()
+    
     try:
+        # Raw image bytes (application/octet-stream or image/*) skip form and JSON parsing
+        if is_binary_upload(request):
+            image_bytes = request.get_data(cache=False)
+            if not image_bytes:
+                return jsonify({"error": "No image data provided"}), 400
+            return jsonify(predict_and_capture(image_bytes))
+        
         # Handle different input formats
         image_bytes = None
+        payload = request.get_json(silent=True)
         
         print(f"🔍 Request content-type: {request.content_type}")
         print(f"🔍 Request has files: {'image' in request.files}")
-        print(f"🔍 Request has json: {request.json is not None}")
+        print(f"🔍 Request has json: {payload is not None}")
         print(f"🔍 Request has data: {len(request.data) if request.data else 0} bytes")
         
-        if request.json and 'image' in request.json:
+        if payload and 'image' in payload:
             # Base64 encoded image (PRIORITY - this is what we're getting!)
-            import base64
-            image_data = request.json['image']
+            image_data = payload['image']
             print(f"📦 JSON base64 data length: {len(image_data)}")
             print(f"📦 First 50 chars: {image_data[:50]}")
             
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-                print(f"📦 After removing data URL prefix: {len(image_data)}")
-            
             try:
-                image_bytes = base64.b64decode(image_data)
+                image_bytes = decode_base64_image(image_data)
                 print(f"✅ Successfully decoded base64 to {len(image_bytes)} bytes")
                 
-                # Save debug image
-                with open('debug_image.jpg', 'wb') as f:
-                    f.write(image_bytes)
-                print("💾 Saved debug image to debug_image.jpg")
-                
             except Exception as decode_error:
                 print(f"❌ Base64 decode error: {decode_error}")
                 return jsonify({"error": f"Base64 decode error: {decode_error}"}), 400
@@ -342,8 +737,7 @@ def predict():
             return jsonify({"error": "No image data provided"}), 400
         
         # Get prediction
-        result = classifier.predict(image_bytes)
-        return jsonify(result)
+        return jsonify(predict_and_capture(image_bytes))
         
     except Exception as e:
         print(f"Error in predict endpoint: {e}")
@@ -354,15 +748,89 @@ def predict():
             "mode": "fallback"
         }), 500
 
+@app.route('/predictions/waste_classifier/batch', methods=['POST'])
+def predict_batch():
+    """
+    Classify many images in one request
+    Accepts a length-prefixed binary body (application/x-ecosage-batch, see
+    binary_batch.py), multipart files (any field name, repeated) or JSON
+    {"images": [base64, ...]}. Results are returned in input order
+    """
+    if not classifier.ready.is_set():
+        return not_ready_response()
+    
+    try:
+        images = []
+        max_images = int(os.getenv('BATCH_REQUEST_MAX_IMAGES', '64'))
+        payload = None if request.mimetype == BATCH_CONTENT_TYPE else request.get_json(silent=True)
+        
+        if request.mimetype == BATCH_CONTENT_TYPE:
+            try:
+                images = unpack_images(request.get_data(cache=False), max_images)
+            except OverflowError as e:
+                return jsonify({"error": str(e)}), 413
+            except ValueError as e:
+                print(f"❌ Malformed binary batch: {e}")
+                return jsonify({"error": f"Malformed binary batch: {e}"}), 400
+        elif payload and isinstance(payload.get('images'), list):
+            for index, image_data in enumerate(payload['images']):
+                try:
+                    images.append(decode_base64_image(image_data))
+                except Exception as decode_error:
+                    print(f"❌ Base64 decode error for image {index}: {decode_error}")
+                    return jsonify({"error": f"Base64 decode error for image {index}: {decode_error}"}), 400
+        elif request.files:
+            # Repeat one field name (e.g. "images") to keep the upload order
+            for _, file in request.files.items(multi=True):
+                images.append(file.read())
+        
+        if not images:
+            print("❌ No images found in batch request")
+            return jsonify({"error": "No images provided"}), 400
+        
+        if len(images) > max_images:
+            return jsonify({"error": f"Too many images: {len(images)} (max {max_images})"}), 413
+        
+        print(f"📦 Batch request with {len(images)} images")
+        results = classifier.predict_many(images)
+        if debug_capture:
+            for image_bytes, result in zip(images, results):
+                debug_capture.capture(image_bytes, result)
+        return jsonify({"count": len(results), "results": results})
+        
+    except Exception as e:
+        print(f"Error in batch predict endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/health', methods=['GET'])
 def health():
+    # Liveness: answers as soon as Flask is up, even while the model loads
     return jsonify({
         "status": "healthy",
+        "ready": classifier.ready.is_set(),
         "model_loaded": classifier.model is not None,
-        "device": str(classifier.device),
-        "classes": classifier.classes
+        "device": str(classifier.device) if classifier.device else None,
+        "precision": classifier.precision,
+        "backend": classifier.model.describe() if classifier.model else None,
+        "classes": classifier.classes,
+        "batching": classifier.batcher.stats() if classifier.batcher else None,
+        "preprocessing": classifier.preprocess_pool.stats(),
+        "tta": {"views": classifier.tta_views, "threshold": classifier.tta_threshold} if classifier.tta_views else None,
+        "cache": classifier.cache.stats() if classifier.cache else None,
+        "near_duplicate_cache": classifier.near_cache.stats() if classifier.near_cache else None,
+        "debug_capture": debug_capture.stats() if debug_capture else None
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    # Readiness: 200 only once the model is loaded and warmed up (or demo mode was chosen)
+    is_ready = classifier.ready.is_set()
+    return jsonify({
+        "ready": is_ready,
+        "model_loaded": classifier.model is not None,
+        "model_version": classifier.model_version
+    }), (200 if is_ready else 503)
+
 @app.route('/', methods=['GET'])
 def root():
     return jsonify({
@@ -370,19 +838,29 @@ def root():
         "status": "running",
         "endpoints": {
             "predict": "/predictions/waste_classifier",
-            "health": "/health"
+            "predict_batch": "/predictions/waste_classifier/batch",
+            "health": "/health",
+            "ready": "/ready"
         }
     })
 
 if __name__ == '__main__':
+    # MODEL_SERVER_PORT lets several replicas run side by side behind the backend
+    port = int(os.getenv('MODEL_SERVER_PORT', '8080'))
+    
     print("🚀 Starting EcoSage Model Server...")
-    print("📡 Server will run on http://127.0.0.1:8080")
-    print("🧠 Model status:", "✅ Loaded" if classifier.model else "⚠️ Demo Mode")
-    print("🎯 Device:", classifier.device)
+    print(f"📡 Server will run on http://127.0.0.1:{port}")
+    if classifier.ready.is_set():
+        print("🧠 Model status:", "✅ Loaded" if classifier.model else "⚠️ Demo Mode")
+        print("🎯 Device:", classifier.device)
+    else:
+        print("🧠 Model status: ⏳ Loading in background (poll /ready)")
     print("📝 Available classes:", classifier.classes)
     print("\n🔗 Available endpoints:")
-    print("   • http://127.0.0.1:8080/health")
-    print("   • http://127.0.0.1:8080/predictions/waste_classifier")
+    print(f"   • http://127.0.0.1:{port}/health")
+    print(f"   • http://127.0.0.1:{port}/ready")
+    print(f"   • http://127.0.0.1:{port}/predictions/waste_classifier")
+    print(f"   • http://127.0.0.1:{port}/predictions/waste_classifier/batch")
     print("\n🌱 Ready to classify waste images!")
     
-    app.run(host='127.0.0.1', port=8080, debug=False, threaded=True)
\ No newline at end of file
+    app.run(host='127.0.0.1', port=port, debug=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Packed, memory-mapped copy of the training images
+preprocess_dataset.py decodes every JPEG once, resizes it to a fixed square
+and stores the pixels of a split in a single uint8 .npy array next to its
+labels. Training then reads images with a memcpy out of the page cache
+instead of opening and decoding a full-size JPEG every epoch
+"""
+
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+PACKED_DIR = "Dataset_packed"
+PACKED_SIZE = 256
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def split_paths(packed_dir, split):
+    """Paths of the image array, label array and metadata for one split"""
+    base = os.path.join(packed_dir, split)
+    return base + '_images.npy', base + '_labels.npy', base + '.json'
+
+
+def list_images(split_dir):
+    """
+    ImageFolder-style listing: one sub-directory per class, sorted
+
+    Returns:
+        tuple: (class names, list of (path, label))
+    """
+    classes = sorted(d for d in os.listdir(split_dir) if os.path.isdir(os.path.join(split_dir, d)))
+    samples = []
+    for label, class_name in enumerate(classes):
+        class_dir = os.path.join(split_dir, class_name)
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_dir, name), label))
+    return classes, samples
+
+
+def load_fixed_size(path, size=PACKED_SIZE):
+    """
+    Decode an image, scale its shorter side to size and center crop a size x size square
+    The same geometry as the validation Resize(256) + CenterCrop, so CenterCrop(224)
+    on a packed image matches the original validation transform
+    """
+    with Image.open(path) as img:
+        # Let the JPEG decoder skip detail we are about to throw away
+        img.draft('RGB', (size, size))
+        img = img.convert('RGB')
+        width, height = img.size
+        scale = size / min(width, height)
+        resized = img.resize((max(size, round(width * scale)), max(size, round(height * scale))), Image.BILINEAR)
+    left = (resized.width - size) // 2
+    top = (resized.height - size) // 2
+    return np.asarray(resized.crop((left, top, left + size, top + size)), dtype=np.uint8)
+
+
+def pack_split(data_dir, split, packed_dir=PACKED_DIR, size=PACKED_SIZE, workers=0):
+    """
+    Decode one split of an ImageFolder dataset into a packed uint8 array
+
+    Args:
+        data_dir (str): Dataset root containing <split>/<class>/<image>
+        split (str): 'train' or 'val'
+        packed_dir (str): Output directory
+        size (int): Side of the stored square images
+        workers (int): Decoding processes, 0 decodes in this process
+
+    Returns:
+        dict: The metadata written next to the arrays
+    """
+    classes, samples = list_images(os.path.join(data_dir, split))
+    images_path, labels_path, meta_path = split_paths(packed_dir, split)
+    os.makedirs(packed_dir, exist_ok=True)
+
+    # Written through a memmap so the whole split never has to fit in memory
+    images = np.lib.format.open_memmap(images_path + '.tmp', mode='w+', dtype=np.uint8,
+                                       shape=(len(samples), size, size, 3))
+    paths = [path for path, _ in samples]
+    if workers > 0:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as pool:
+            decoded = pool.map(load_fixed_size, paths, [size] * len(paths), chunksize=16)
+            for i, array in enumerate(decoded):
+                images[i] = array
+    else:
+        for i, path in enumerate(paths):
+            images[i] = load_fixed_size(path, size)
+    images.flush()
+    del images
+    os.replace(images_path + '.tmp', images_path)
+
+    np.save(labels_path, np.array([label for _, label in samples], dtype=np.int64))
+    metadata = {
+        "classes": classes,
+        "size": size,
+        "count": len(samples),
+        "source": os.path.join(data_dir, split),
+        "files": [os.path.relpath(path, data_dir) for path in paths]
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+class PackedImageDataset:
+    """
+    Dataset over a split written by pack_split, a drop-in for datasets.ImageFolder
+    Items are (transform(PIL image), label). The array is opened lazily in each
+    DataLoader worker, so workers share the page cache instead of pickling pixels
+    """
+
+    def __init__(self, packed_dir, split, transform=None):
+        self.images_path, labels_path, meta_path = split_paths(packed_dir, split)
+        with open(meta_path) as f:
+            metadata = json.load(f)
+        self.classes = metadata['classes']
+        self.size = metadata['size']
+        self.targets = np.load(labels_path).tolist()
+        self.transform = transform
+        self._images = None
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, index):
+        if self._images is None:
+            self._images = np.load(self.images_path, mmap_mode='r')
+        img = Image.fromarray(np.array(self._images[index]))
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, self.targets[index]
+
+    def __getstate__(self):
+        # Never ship the mapping itself to worker processes
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
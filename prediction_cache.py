@@ -0,0 +1,282 @@
+"""
+Prediction caching for the EcoSage model server
+Stores classification results keyed by a hash of the uploaded image bytes so
+repeated uploads skip decoding and inference entirely. The optional disk copy
+is written by a background thread, so requests only pay for a non-blocking
+queue put and writes are dropped rather than queued when the disk falls behind
+"""
+
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+def image_hash(image_bytes):
+    """Content hash used as the cache key for an uploaded image"""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, ttl_seconds=3600, disk_dir=None, max_pending_writes=1024):
+        """
+        Args:
+            max_entries (int): Maximum results kept in memory (LRU eviction)
+            ttl_seconds (float): How long a result stays valid, 0 for no expiry
+            disk_dir (str): Optional directory that keeps results across restarts
+            max_pending_writes (int): Disk writes waiting for the writer before new ones are dropped
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.disk_dir = disk_dir
+        self.model_version = None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._disk_dropped = 0
+
+        self._writes = None
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._writes = queue.Queue(maxsize=max(1, int(max_pending_writes)))
+            self._writer = threading.Thread(target=self._run_writer, name='prediction-cache-writer', daemon=True)
+            self._writer.start()
+
+    def get(self, key):
+        """Return a cached result for the key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if self.ttl and expires_at < now:
+                    del self._entries[key]
+                    self._expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return result
+
+        result = self._disk_get(key, now)
+        with self._lock:
+            if result is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._store(key, result, now)
+        return result
+
+    def put(self, key, result):
+        now = time.time()
+        with self._lock:
+            self._store(key, result, now)
+            model_version = self.model_version
+        self._disk_put(key, result, model_version, now)
+
+    def invalidate(self, model_version):
+        """
+        Drop every cached result, e.g. because a different model was loaded
+
+        Args:
+            model_version (str): Identifies the model and every setting that changes
+                its outputs; disk entries written under another version are ignored
+        """
+        with self._lock:
+            self.model_version = model_version
+            self._entries.clear()
+        # Disk entries are tagged with the model version and ignored when it differs
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "disk": bool(self.disk_dir),
+                "disk_pending": self._writes.qsize() if self._writes is not None else 0,
+                "disk_dropped": self._disk_dropped
+            }
+
+    def _store(self, key, result, now):
+        # Caller holds the lock
+        self._entries[key] = (now + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("model_version") != self.model_version:
+            return None
+        if self.ttl and record.get("created_at", 0) + self.ttl < now:
+            return None
+        return record.get("result")
+
+    def _disk_put(self, key, result, model_version, now):
+        """Queue a disk write for the background writer, never blocks"""
+        if self._writes is None:
+            return
+        try:
+            self._writes.put_nowait((key, result, model_version, now))
+        except queue.Full:
+            with self._lock:
+                self._disk_dropped += 1
+
+    def _run_writer(self):
+        while True:
+            key, result, model_version, now = self._writes.get()
+            self._disk_write(key, result, model_version, now)
+
+    def _disk_write(self, key, result, model_version, now):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Temp file + rename, so readers never see a half-written entry
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({"model_version": model_version, "created_at": now, "result": result}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write prediction cache entry: {e}")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class MultiIndexHashTable:
+    """
+    Multi-index hashing over 64-bit perceptual hashes
+    Each hash is split into max_distance + 1 chunks. Two hashes within
+    max_distance bits must agree exactly on at least one chunk, so a lookup
+    only checks the entries sharing a chunk with the query instead of all of them
+    """
+
+    def __init__(self, max_distance, bits=64):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        self._chunks = []
+        start = 0
+        for index in range(chunks):
+            width = bits // chunks + (1 if index < bits % chunks else 0)
+            self._chunks.append((start, (1 << width) - 1))
+            start += width
+        self._tables = [{} for _ in self._chunks]
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def _keys(self, hash_value):
+        return [(hash_value >> start) & mask for start, mask in self._chunks]
+
+    def add(self, hash_value, value):
+        if hash_value not in self._values:
+            for table, key in zip(self._tables, self._keys(hash_value)):
+                table.setdefault(key, set()).add(hash_value)
+        self._values[hash_value] = value
+
+    def remove(self, hash_value):
+        if self._values.pop(hash_value, None) is None:
+            return
+        for table, key in zip(self._tables, self._keys(hash_value)):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(hash_value)
+                if not bucket:
+                    del table[key]
+
+    def search(self, hash_value):
+        """Return (distance, stored hash) of the closest entry within max_distance, or None"""
+        if hash_value in self._values:
+            return 0, hash_value
+
+        best = None
+        for table, key in zip(self._tables, self._keys(hash_value)):
+            for candidate in table.get(key, ()):
+                distance = hamming_distance(hash_value, candidate)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+        return best
+
+    def get(self, hash_value):
+        return self._values[hash_value]
+
+
+class NearDuplicateCache:
+    def __init__(self, max_distance=4, max_entries=100000):
+        """
+        Args:
+            max_distance (int): Largest Hamming distance between 64-bit dHashes
+                that still counts as the same photo
+            max_entries (int): Maximum stored hashes (LRU eviction)
+        """
+        self.max_distance = int(max_distance)
+        self.max_entries = max(1, int(max_entries))
+
+        self._index = MultiIndexHashTable(self.max_distance)
+        self._order = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, hash_value):
+        """Return (distance, result) for the closest stored photo, or None"""
+        with self._lock:
+            match = self._index.search(hash_value)
+            if match is None:
+                self._misses += 1
+                return None
+            distance, stored_hash = match
+            self._order.move_to_end(stored_hash)
+            self._hits += 1
+            return distance, self._index.get(stored_hash)
+
+    def put(self, hash_value, result):
+        with self._lock:
+            self._index.add(hash_value, result)
+            self._order[hash_value] = None
+            self._order.move_to_end(hash_value)
+            while len(self._order) > self.max_entries:
+                oldest, _ = self._order.popitem(last=False)
+                self._index.remove(oldest)
+
+    def invalidate(self):
+        with self._lock:
+            self._index = MultiIndexHashTable(self.max_distance)
+            self._order.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._order),
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0
+            }
@@ -0,0 +1,38 @@
+"""
+Decode the training dataset once into packed, memory-mapped arrays
+Writes <split>_images.npy (N x size x size x 3 uint8), <split>_labels.npy and
+<split>.json for every split. Train from it with
+    python train.py --packed-dir Dataset_packed
+Re-run after adding or removing images
+"""
+
+import argparse
+import os
+import time
+
+from packed_dataset import PACKED_DIR, PACKED_SIZE, pack_split
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the dataset into memory-mapped uint8 arrays")
+    parser.add_argument('--data-dir', default='Dataset')
+    parser.add_argument('--output', default=PACKED_DIR)
+    parser.add_argument('--size', type=int, default=PACKED_SIZE,
+                        help="Side of the stored square images, at least the 224 training crop")
+    parser.add_argument('--splits', nargs='+', default=['train', 'val'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Decoding processes")
+    args = parser.parse_args()
+
+    for split in args.splits:
+        start = time.time()
+        print(f"📦 Packing {os.path.join(args.data_dir, split)} at {args.size}x{args.size}...")
+        metadata = pack_split(args.data_dir, split, args.output, args.size, args.workers)
+        megabytes = metadata['count'] * args.size * args.size * 3 / 1024 / 1024
+        print(f"✅ {metadata['count']} images, {len(metadata['classes'])} classes, "
+              f"{megabytes:.0f} MB in {time.time() - start:.1f}s")
+
+    print(f"💾 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Image preprocessing for the EcoSage model server
+Decodes uploaded images and turns them into normalized model inputs without
+importing torch, so the work can run in thread or process pools that feed
+ready arrays to the inference stage
+"""
+
+import io
+import os
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Same preprocessing as training: Resize((224, 224)) -> ToTensor -> Normalize
+IMAGE_SIZE = 224
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def decode_image(image_bytes, draft=False):
+    """
+    Decode raw image bytes into an RGB PIL image
+    
+    Args:
+        image_bytes (bytes): Encoded image
+        draft (bool): Let the JPEG decoder scale by 1/2, 1/4 or 1/8 during
+            decoding, picking the smallest size that still covers 224x224
+    """
+    # PIL detects the format from the content, so the bytes are decoded in memory only
+    image = Image.open(io.BytesIO(image_bytes))
+    if draft and image.format == 'JPEG':
+        # DCT scaling skips most of the work for phone-sized photos
+        image.draft('RGB', (IMAGE_SIZE, IMAGE_SIZE))
+    return image.convert('RGB')
+
+
+def image_to_array(image):
+    """
+    Resize and normalize an RGB PIL image
+
+    Returns:
+        np.ndarray: float32 array shaped (3, 224, 224)
+    """
+    # PIL's resize and numpy's arithmetic both release the GIL
+    image = image.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
+    array = np.asarray(image, dtype=np.float32) / 255.0
+    array = (array - MEAN) / STD
+    return np.ascontiguousarray(array.transpose(2, 0, 1))
+
+
+def array_to_image(array):
+    """Undo image_to_array's normalization, giving back a 224x224 RGB PIL image"""
+    pixels = (array.transpose(1, 2, 0) * STD + MEAN) * 255.0
+    return Image.fromarray(np.clip(np.rint(pixels), 0, 255).astype(np.uint8))
+
+
+# Views available to test-time augmentation. 'flip' mirrors the normal
+# full-image view; the crops are cut from a TTA_RESIZE x TTA_RESIZE resize
+TTA_VIEWS = ['flip', 'center', 'top_left', 'top_right', 'bottom_left', 'bottom_right']
+TTA_RESIZE = 256
+
+
+def tta_arrays(image, views):
+    """
+    Build augmented views of a decoded image for test-time augmentation
+
+    Args:
+        image (PIL.Image): RGB image
+        views (list): Names from TTA_VIEWS
+
+    Returns:
+        np.ndarray: float32 array shaped (len(views), 3, 224, 224)
+    """
+    offset = TTA_RESIZE - IMAGE_SIZE
+    boxes = {
+        'center': (offset // 2, offset // 2),
+        'top_left': (0, 0),
+        'top_right': (offset, 0),
+        'bottom_left': (0, offset),
+        'bottom_right': (offset, offset)
+    }
+
+    arrays = []
+    resized = None
+    for view in views:
+        if view == 'flip':
+            arrays.append(image_to_array(image.transpose(Image.FLIP_LEFT_RIGHT)))
+        elif view in boxes:
+            if resized is None:
+                resized = image.resize((TTA_RESIZE, TTA_RESIZE), Image.BILINEAR)
+            left, top = boxes[view]
+            arrays.append(image_to_array(resized.crop((left, top, left + IMAGE_SIZE, top + IMAGE_SIZE))))
+        else:
+            raise ValueError(f"Unknown TTA view: {view}")
+    return np.stack(arrays)
+
+
+def preprocess_image_bytes(image_bytes, draft=False):
+    """Decode image bytes into a normalized (3, 224, 224) float32 array"""
+    return image_to_array(decode_image(image_bytes, draft=draft))
+
+
+def dhash(image, hash_size=8):
+    """
+    64-bit difference hash of an image
+    Survives re-encoding, resizing and small framing changes, so photos of the
+    same item land within a few bits of each other
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def _preprocess_job(image_bytes, draft, perceptual_hash):
+    image = decode_image(image_bytes, draft=draft)
+    return image_to_array(image), (dhash(image) if perceptual_hash else None)
+
+
+def _tta_job(array, views):
+    # Built from the already preprocessed 224x224 input, so the upload is not decoded twice
+    return tta_arrays(array_to_image(array), views)
+
+
+def _warmup(_):
+    return os.getpid()
+
+
+class PreprocessPool:
+    def __init__(self, mode='thread', workers=None, draft=False, perceptual_hash=False):
+        """
+        Args:
+            mode (str): 'thread' for a GIL-releasing thread pool, 'process' for
+                separate worker processes
+            workers (int): Number of workers, defaults to the CPU count
+            draft (bool): Use reduced-size JPEG decoding (see decode_image)
+            perceptual_hash (bool): Also compute a dHash of every decoded image
+        """
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 4
+        self.draft = draft
+        self.perceptual_hash = perceptual_hash
+
+        if mode == 'process':
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context()
+            )
+            # Start every worker now, while the server has no other threads
+            # and before the model is loaded, so forked workers stay small
+            list(self.executor.map(_warmup, range(self.workers)))
+        elif mode == 'thread':
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix='preprocess'
+            )
+        else:
+            raise ValueError(f"Unknown preprocessing mode: {mode}")
+
+    def submit(self, image_bytes):
+        """
+        Queue one image
+        
+        Returns:
+            Future: Resolves to ((3, 224, 224) array, dHash or None)
+        """
+        return self.executor.submit(_preprocess_job, image_bytes, self.draft, self.perceptual_hash)
+
+    def run(self, image_bytes):
+        return self.submit(image_bytes).result()
+
+    def submit_tta(self, array, views):
+        """
+        Queue the test-time augmentation views of one preprocessed image
+
+        Args:
+            array (np.ndarray): (3, 224, 224) output of image_to_array
+            views (list): Names from TTA_VIEWS
+
+        Returns:
+            Future: Resolves to a (len(views), 3, 224, 224) array
+        """
+        return self.executor.submit(_tta_job, array, views)
+
+    def map(self, images):
+        """
+        Preprocess several images in parallel
+
+        Returns:
+            list: One (array, dHash) pair per image, or the exception raised for that image
+        """
+        futures = [self.submit(image_bytes) for image_bytes in images]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self):
+        return {"mode": self.mode, "workers": self.workers, "draft_decode": self.draft}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
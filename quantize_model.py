@@ -0,0 +1,82 @@
+"""
+Post-training static INT8 quantization for the EcoSage waste classifier
+Calibrates on a sample of Dataset/train, reports top-1 accuracy on Dataset/val
+and CPU latency against fp32, and saves a TorchScript INT8 model that the
+server loads with MODEL_PRECISION=int8
+"""
+
+import argparse
+import random
+
+import numpy as np
+import torch
+
+from evaluation import list_split, read_bytes, predict_arrays, time_per_image
+from model_architecture import find_model_path, load_checkpoint_model, INT8_MODEL_PATH
+from model_optimization import quantize_static_int8
+from preprocessing import preprocess_image_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the waste classifier to INT8")
+    parser.add_argument('--data-dir', default='Dataset')
+    parser.add_argument('--model', default=None, help="fp32 checkpoint, defaults to the first trained model found")
+    parser.add_argument('--output', default=INT8_MODEL_PATH)
+    parser.add_argument('--calibration-images', type=int, default=256)
+    parser.add_argument('--backend', default='x86', choices=['x86', 'fbgemm', 'qnnpack', 'onednn'])
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    model_path = args.model or find_model_path()
+    if model_path is None:
+        print("❌ No trained model found")
+        return
+
+    print(f"🔍 Loading fp32 model from: {model_path}")
+    model, _ = load_checkpoint_model(model_path, 'cpu')
+
+    # Calibration sample from the training split, preprocessed like served images
+    train_samples = list_split(args.data_dir, 'train')
+    random.Random(args.seed).shuffle(train_samples)
+    calibration = [preprocess_image_bytes(read_bytes(path)) for path, _ in train_samples[:args.calibration_images]]
+    calibration_batches = [
+        torch.from_numpy(np.stack(calibration[start:start + args.batch_size]))
+        for start in range(0, len(calibration), args.batch_size)
+    ]
+    print(f"📏 Calibrating on {len(calibration)} training images ({args.backend} backend)")
+    quantized = quantize_static_int8(model, calibration_batches, backend=args.backend)
+
+    torch.jit.save(quantized, args.output)
+    print(f"💾 Saved INT8 model to {args.output}")
+
+    # Accuracy on the validation split
+    val_samples = list_split(args.data_dir, 'val')
+    labels = np.array([label for _, label in val_samples])
+    arrays = [preprocess_image_bytes(read_bytes(path)) for path, _ in val_samples]
+    fp32_probs = predict_arrays(model, arrays, args.batch_size)
+    int8_probs = predict_arrays(quantized, arrays, args.batch_size)
+
+    # Latency at batch 1 and a typical micro-batch
+    latency = {}
+    for batch_size in [1, 8]:
+        batch = [torch.from_numpy(np.stack(arrays[:batch_size]))] * 3
+        with torch.no_grad():
+            for name, candidate in [('fp32', model), ('int8', quantized)]:
+                candidate(batch[0])
+                latency[(name, batch_size)] = time_per_image(candidate, batch) / batch_size
+
+    print("\n--- INT8 QUANTIZATION REPORT ---")
+    print(f"Validation images:   {len(labels)}")
+    print(f"fp32 top-1 accuracy: {np.mean(fp32_probs.argmax(axis=1) == labels):.4f}")
+    print(f"int8 top-1 accuracy: {np.mean(int8_probs.argmax(axis=1) == labels):.4f}")
+    print(f"Top-1 agreement:     {np.mean(fp32_probs.argmax(axis=1) == int8_probs.argmax(axis=1)):.4f}")
+    for batch_size in [1, 8]:
+        fp32_ms = latency[('fp32', batch_size)]
+        int8_ms = latency[('int8', batch_size)]
+        print(f"Batch {batch_size} latency:     fp32 {fp32_ms:.1f} ms/image, int8 {int8_ms:.1f} ms/image "
+              f"({fp32_ms / int8_ms:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
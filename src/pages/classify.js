@@ -63,7 +63,9 @@ export default function Classify() {
       const formData = new FormData();
       formData.append('image', selectedImage);
 
-      const response = await fetch('http://localhost:5000/api/classify', {
+      // NEXT_PUBLIC_CLASSIFY_URL points at backend/classify_gateway.py when it is running
+      const classifyUrl = process.env.NEXT_PUBLIC_CLASSIFY_URL || 'http://localhost:5000/api/classify';
+      const response = await fetch(classifyUrl, {
         method: 'POST',
         body: formData,
       });
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+
+from micro_batcher import MicroBatcher
+
+
+def recording_batcher(max_batch_size, max_wait_ms=50.0):
+    """Batcher whose infer_fn records the number of images in every forward pass"""
+    passes = []
+
+    def infer(items):
+        passes.append(sum(len(item) for item in items))
+        return [item * 2 for item in items]
+
+    return MicroBatcher(infer, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms), passes
+
+
+def test_batch_cap_counts_images():
+    batcher, passes = recording_batcher(max_batch_size=8)
+    sizes = [5, 3, 6, 2, 7, 1, 8, 4]
+    items = [np.full((size, 2), index, dtype=np.float32) for index, size in enumerate(sizes)]
+
+    # Submitted together so they compete for the same batches
+    futures = [batcher.submit(item) for item in items]
+    results = [future.result(timeout=5) for future in futures]
+
+    for item, result in zip(items, results):
+        assert np.array_equal(result, item * 2)
+    assert max(passes) <= 8
+    assert sum(passes) == sum(sizes)
+
+    stats = batcher.stats()
+    assert stats["images"] == sum(sizes)
+    assert stats["items"] == len(sizes)
+    assert stats["largest_batch"] <= 8
+
+
+def test_concurrent_multi_row_submissions():
+    batcher, passes = recording_batcher(max_batch_size=8, max_wait_ms=20.0)
+
+    def client():
+        for _ in range(10):
+            batcher(np.ones((3, 2), dtype=np.float32), timeout=5)
+
+    threads = [threading.Thread(target=client) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(passes) == 4 * 10 * 3
+    assert max(passes) <= 8
+
+
+def test_oversized_item_rejected():
+    batcher, passes = recording_batcher(max_batch_size=4)
+    try:
+        batcher.submit(np.ones((5, 2), dtype=np.float32))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected a ValueError for an item larger than the batch limit")
+    assert passes == []
+
+
+if __name__ == "__main__":
+    test_batch_cap_counts_images()
+    test_concurrent_multi_row_submissions()
+    test_oversized_item_rejected()
+    print("✅ Micro-batcher tests passed")
@@ -1,27 +1,236 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
-from torchvision import datasets, models, transforms
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torchvision import datasets, transforms
+import numpy as np
+import argparse
+import contextlib
 import os
+import random
 import time
-import copy
 import ssl
 
+from packed_dataset import PackedImageDataset
+from model_architecture import STUDENT_ARCHS, build_classifier, save_classifier_checkpoint, load_checkpoint_model
+
 # FIX FOR SSL CERTIFICATE ERROR
 ssl._create_default_https_context = ssl._create_unverified_context
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the EcoSage waste classifier")
+    parser.add_argument('--mode', choices=['train', 'distill'], default='train',
+                        help="'train' fine-tunes ResNet18 on the labels, 'distill' trains a smaller "
+                             "student on the teacher's soft targets")
+    parser.add_argument('--data-dir', default='Dataset')
+    parser.add_argument('--packed-dir', default=None,
+                        help="Read images from preprocess_dataset.py arrays instead of decoding the JPEGs every epoch")
+    parser.add_argument('--output', default=None,
+                        help="Defaults to waste_classifier_model_v2.pth, or waste_classifier_student.pth when distilling")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--accumulation-steps', type=int, default=1,
+                        help="Batches whose gradients are summed per optimizer step, "
+                             "for an effective batch of batch-size x accumulation-steps")
+    parser.add_argument('--amp', action='store_true',
+                        help="Mixed precision: bfloat16 autocast on CPU, float16 autocast with loss scaling on CUDA")
+    parser.add_argument('--channels-last', action='store_true', help="NHWC model and input layout")
+
+    # --- Checkpointing ---
+    parser.add_argument('--checkpoint-dir', default='checkpoints',
+                        help="Where training state is snapshotted as <output name>_last.pth")
+    parser.add_argument('--checkpoint-every', type=int, default=1, help="Epochs between snapshots, 0 disables them")
+    parser.add_argument('--resume', nargs='?', const='auto', default=None,
+                        help="Continue from a training snapshot, defaults to this run's latest one")
+    parser.add_argument('--no-pretrained', action='store_true', help="Start from random instead of ImageNet weights")
+
+    # --- Data loading ---
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help="DataLoader worker processes decoding and augmenting images, 0 loads in the training loop")
+    parser.add_argument('--prefetch-factor', type=int, default=2, help="Batches each worker prepares ahead")
+    parser.add_argument('--threads', type=int, default=0,
+                        help="Intra-op threads per training process, 0 splits the cores between the processes on this host")
+
+    # --- Distillation ---
+    parser.add_argument('--teacher', default='waste_classifier_model_v2.pth')
+    parser.add_argument('--student', choices=STUDENT_ARCHS, default='mobilenet_v2')
+    parser.add_argument('--temperature', type=float, default=4.0, help="Softens teacher and student logits")
+    parser.add_argument('--alpha', type=float, default=0.7,
+                        help="Weight of the soft-target loss, the rest goes to the hard labels")
+    return parser.parse_args()
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature, alpha):
+    """
+    Hinton-style knowledge distillation loss
+    KL divergence between temperature-softened distributions, scaled by T^2 so
+    its gradients stay comparable to the cross-entropy on the true labels
+    """
+    soft_loss = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.softmax(teacher_logits / temperature, dim=1),
+        reduction='batchmean'
+    ) * (temperature ** 2)
+    hard_loss = F.cross_entropy(student_logits, labels)
+    return alpha * soft_loss + (1 - alpha) * hard_loss
+
+def count_flops(model, device):
+    """Multiply-accumulates of one 224x224 forward pass (conv and linear layers)"""
+    total = 0
+
+    def hook(module, inputs, output):
+        nonlocal total
+        if isinstance(module, nn.Conv2d):
+            total += output.numel() * module.in_channels // module.groups * module.kernel_size[0] * module.kernel_size[1]
+        elif isinstance(module, nn.Linear):
+            total += module.in_features * module.out_features
+
+    handles = [m.register_forward_hook(hook) for m in model.modules() if isinstance(m, (nn.Conv2d, nn.Linear))]
+    was_training = model.training
+    model.eval()
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 224, 224, device=device))
+    model.train(was_training)
+    for handle in handles:
+        handle.remove()
+    return total
+
+def save_training_state(path, epoch, model, optimizer, scaler, best_model_wts, best_acc):
+    """
+    Snapshot everything needed to continue training after epoch completed epochs
+    Written to a temporary file and renamed, so a crash mid-write keeps the previous snapshot
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    torch.save({
+        'epoch': epoch,
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'scaler': scaler.state_dict(),
+        'best_model': best_model_wts,
+        'best_acc': best_acc,
+        'rng': {
+            'python': random.getstate(),
+            'numpy': np.random.get_state(),
+            'torch': torch.get_rng_state(),
+            'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else []
+        }
+    }, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def load_training_state(path, model, optimizer, scaler, best_model_wts):
+    """
+    Restore a save_training_state snapshot in place
+    In a distributed run only rank 0 reads the file and broadcasts it, so ranks on
+    other nodes do not need the checkpoint directory on a shared filesystem
+
+    Returns:
+        tuple: (number of completed epochs, best validation accuracy so far)
+    """
+    state = None
+    if is_main_process():
+        # Snapshots hold RNG state (numpy arrays, tuples) alongside the tensors
+        state = torch.load(path, map_location='cpu', weights_only=False)
+    if dist.is_initialized():
+        holder = [state]
+        dist.broadcast_object_list(holder, src=0)
+        state = holder[0]
+    model.load_state_dict(state['model'])
+    optimizer.load_state_dict(state['optimizer'])
+    scaler.load_state_dict(state['scaler'])
+    for name, tensor in state['best_model'].items():
+        best_model_wts[name].copy_(tensor)
+
+    random.setstate(state['rng']['python'])
+    np.random.set_state(state['rng']['numpy'])
+    torch.set_rng_state(state['rng']['torch'])
+    if state['rng']['cuda'] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['rng']['cuda'])
+    return state['epoch'], state['best_acc']
+
+def make_dataloader(dataset, batch_size, shuffle, workers, prefetch_factor, pin_memory, sampler=None):
+    """
+    DataLoader that decodes and augments in worker processes
+    Workers persist across epochs instead of being re-forked for every phase,
+    and pinned batches let the host-to-GPU copy overlap with compute
+    """
+    options = {}
+    if workers > 0:
+        options = dict(persistent_workers=True, prefetch_factor=prefetch_factor)
+    return torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=shuffle and sampler is None,
+                                       sampler=sampler, num_workers=workers, pin_memory=pin_memory, **options)
+
+def init_distributed():
+    """
+    Join the process group when launched by torchrun with more than one process
+    gloo runs on CPU-only hosts; multi-node runs use torchrun's --nnodes/--rdzv-endpoint
+
+    Returns:
+        bool: True when training is distributed
+    """
+    if int(os.environ.get('WORLD_SIZE', '1')) <= 1:
+        return False
+    dist.init_process_group(backend='gloo')
+    return True
+
+def is_main_process():
+    return not dist.is_initialized() or dist.get_rank() == 0
+
+def log(*args, **kwargs):
+    """print on rank 0 only, so a distributed run reports once"""
+    if is_main_process():
+        print(*args, **kwargs)
+
+def shard_datasets(image_datasets):
+    """
+    Split the datasets between the processes of a distributed run
+
+    Returns:
+        tuple: (per-process datasets, training sampler)
+    """
+    rank, world_size = dist.get_rank(), dist.get_world_size()
+    # Reshuffled every epoch via set_epoch; pads the last shard so every rank steps together
+    train_sampler = torch.utils.data.distributed.DistributedSampler(image_datasets['train'], shuffle=True)
+    # Validation shards are disjoint and unpadded so the all-reduced metrics count every image once
+    val_indices = range(rank, len(image_datasets['val']), world_size)
+    return {'train': image_datasets['train'], 'val': torch.utils.data.Subset(image_datasets['val'], val_indices)}, train_sampler
+
 def main():
-    print(f"PyTorch Version: {torch.__version__}")
-    print(f"CUDA Available: {torch.cuda.is_available()}")
+    args = parse_args()
+    distributed = init_distributed()
+    log(f"PyTorch Version: {torch.__version__}")
+    log(f"CUDA Available: {torch.cuda.is_available()}")
 
     # --- Configuration ---
-    data_dir = 'Dataset'
-    model_save_path = 'waste_classifier_model_v2.pth' # Saving as a new version
-    num_classes = len(os.listdir(os.path.join(data_dir, 'train')))
-    batch_size = 32
-    num_epochs = 20
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
+    data_dir = args.data_dir
+    distill = args.mode == 'distill'
+    model_save_path = args.output or ('waste_classifier_student.pth' if distill else 'waste_classifier_model_v2.pth')
+    checkpoint_path = os.path.join(args.checkpoint_dir, os.path.splitext(os.path.basename(model_save_path))[0] + '_last.pth')
+    resume_path = checkpoint_path if args.resume == 'auto' else args.resume
+    if args.resume == 'auto' and not os.path.exists(checkpoint_path):
+        # Bare --resume on a first run starts fresh; an explicit path must exist
+        log(f"No training snapshot at '{checkpoint_path}' yet, starting from epoch 0")
+        resume_path = None
+    if distributed:
+        # Snapshots only exist where rank 0 wrote them, so rank 0 decides for every process
+        holder = [resume_path]
+        dist.broadcast_object_list(holder, src=0)
+        resume_path = holder[0]
+    batch_size = args.batch_size
+    num_epochs = args.epochs
+    local_rank = int(os.environ.get('LOCAL_RANK', '0'))
+    device = torch.device(f"cuda:{local_rank}" if torch.cuda.is_available() else "cpu")
+    log(f"Using device: {device}")
+
+    if distributed:
+        # torchrun defaults every process to one thread; share the host's cores instead
+        local_processes = int(os.environ.get('LOCAL_WORLD_SIZE', '1'))
+        torch.set_num_threads(args.threads or max(1, (os.cpu_count() or 1) // local_processes))
+        log(f"Distributed training on {dist.get_world_size()} processes (gloo), "
+            f"{torch.get_num_threads()} threads each")
+    elif args.threads:
+        torch.set_num_threads(args.threads)
 
     # --- Data Transformations ---
     data_transforms = {
@@ -40,46 +249,133 @@ def main():
     }
 
     # --- Dataloaders ---
-    print("Initializing Datasets and Dataloaders...")
-    image_datasets = {x: datasets.ImageFolder(os.path.join(data_dir, x), data_transforms[x]) for x in ['train', 'val']}
-    dataloaders = {x: torch.utils.data.DataLoader(image_datasets[x], batch_size=batch_size, shuffle=True, num_workers=0) for x in ['train', 'val']}
+    log("Initializing Datasets and Dataloaders...")
+    if args.packed_dir:
+        # Already decoded at a fixed size: epochs are a memcpy plus augmentation
+        log(f"Using packed images from '{args.packed_dir}'")
+        image_datasets = {x: PackedImageDataset(args.packed_dir, x, data_transforms[x]) for x in ['train', 'val']}
+    else:
+        image_datasets = {x: datasets.ImageFolder(os.path.join(data_dir, x), data_transforms[x]) for x in ['train', 'val']}
     dataset_sizes = {x: len(image_datasets[x]) for x in ['train', 'val']}
     class_names = image_datasets['train'].classes
-    print(f"Found {num_classes} classes: {', '.join(class_names)}")
+    num_classes = len(class_names)
+    log(f"Found {num_classes} classes: {', '.join(class_names)} "
+        f"({dataset_sizes['train']} training, {dataset_sizes['val']} validation images)")
 
-    # --- Model Setup ---
-    model = models.resnet18(weights='IMAGENET1K_V1')
-    num_ftrs = model.fc.in_features
-    
-    # === ADDING DROPOUT ===
-    model.fc = nn.Sequential(
-        nn.Dropout(p=0.5),
-        nn.Linear(num_ftrs, num_classes)
-    )
-    # ======================
+    samplers = {'train': None, 'val': None}
+    if distributed:
+        image_datasets, samplers['train'] = shard_datasets(image_datasets)
+    pin_memory = device.type == 'cuda'
+    dataloaders = {x: make_dataloader(image_datasets[x], batch_size, True, args.workers, args.prefetch_factor, pin_memory, samplers[x]) for x in ['train', 'val']}
+    log(f"Loading data with {args.workers} workers (prefetch {args.prefetch_factor}, pinned memory: {pin_memory})")
 
+    # --- Model Setup ---
+    # ResNet18 with a dropout head, or the smaller student when distilling
+    arch = args.student if distill else 'resnet18'
+    model = build_classifier(arch, num_classes, pretrained=not args.no_pretrained)
     model = model.to(device)
+    if args.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    teacher = None
+    if distill:
+        log(f"Loading teacher from '{args.teacher}'...")
+        teacher, _ = load_checkpoint_model(args.teacher, device)
+        if args.channels_last:
+            teacher = teacher.to(memory_format=torch.channels_last)
+        teacher_flops, student_flops = count_flops(teacher, device), count_flops(model, device)
+        log(f"Teacher: {teacher_flops / 1e9:.2f} GMACs, student ({arch}): {student_flops / 1e9:.2f} GMACs "
+            f"({student_flops / teacher_flops * 100:.0f}% of the teacher)")
+
+    if distributed:
+        # Broadcasts rank 0's initial weights, then all-reduces gradients during backward
+        model = DistributedDataParallel(model, device_ids=[local_rank] if device.type == 'cuda' else None)
 
     # --- Loss Function and Optimizer ---
     criterion = nn.CrossEntropyLoss()
-    optimizer = optim.SGD(model.parameters(), lr=0.001, momentum=0.9)
+    optimizer = optim.SGD(model.parameters(), lr=args.lr, momentum=0.9)
 
     # --- Training Loop ---
-    print("Starting model training...")
-    trained_model = train_model(model, criterion, optimizer, dataloaders, dataset_sizes, device, num_epochs=num_epochs)
+    log("Starting model training...")
+    world_size = dist.get_world_size() if distributed else 1
+    log(f"Effective batch size: {batch_size * args.accumulation_steps * world_size} "
+        f"({batch_size} x {args.accumulation_steps} accumulation steps x {world_size} processes), "
+        f"mixed precision: {args.amp}, channels_last: {args.channels_last}")
+    trained_model, best_acc = train_model(model, criterion, optimizer, dataloaders, device, num_epochs=num_epochs,
+                                          teacher=teacher, temperature=args.temperature, alpha=args.alpha,
+                                          amp=args.amp, accumulation_steps=args.accumulation_steps,
+                                          channels_last=args.channels_last,
+                                          checkpoint_path=checkpoint_path if args.checkpoint_every > 0 else None,
+                                          checkpoint_every=args.checkpoint_every, resume=resume_path)
+
+    if not is_main_process():
+        dist.destroy_process_group()
+        return
 
-    print(f"\nTraining finished. Saving model to '{model_save_path}'")
-    torch.save(trained_model.state_dict(), model_save_path)
-    print("Model saved successfully!")
+    log(f"\nTraining finished. Saving model to '{model_save_path}'")
+    if distill:
+        # Records the architecture and classes so the model server and cascade can load it as-is
+        save_classifier_checkpoint(
+            trained_model, model_save_path, arch, class_names,
+            distilled_from=args.teacher,
+            temperature=args.temperature,
+            alpha=args.alpha,
+            epochs=num_epochs,
+            best_val_acc=float(best_acc)
+        )
+    else:
+        torch.save(trained_model.state_dict(), model_save_path)
+    log("Model saved successfully!")
+    if distributed:
+        dist.destroy_process_group()
 
-def train_model(model, criterion, optimizer, dataloaders, dataset_sizes, device, num_epochs=25):
+def train_model(model, criterion, optimizer, dataloaders, device, num_epochs=25,
+                teacher=None, temperature=4.0, alpha=0.7, amp=False, accumulation_steps=1, channels_last=False,
+                checkpoint_path=None, checkpoint_every=1, resume=None):
+    """
+    Train with per-epoch validation and keep the best validation weights
+    A DistributedDataParallel model trains on this process's shard; losses and
+    accuracy are all-reduced so every rank sees the same metrics, and only
+    rank 0 writes training snapshots
+    
+    Args:
+        teacher (torch.nn.Module): When given, training batches use distillation_loss
+            against the teacher's logits; validation always reports plain cross-entropy
+        temperature (float): Distillation temperature
+        alpha (float): Weight of the soft-target loss
+        amp (bool): Autocast forward passes to bfloat16 on CPU or float16 on CUDA
+        accumulation_steps (int): Batches per optimizer step
+        channels_last (bool): Feed inputs in NHWC layout (the model should match)
+        checkpoint_path (str): Training state snapshot written every checkpoint_every epochs
+        resume (str): Snapshot to continue from
+    
+    Returns:
+        tuple: (model with the best weights loaded, best validation accuracy);
+        the unwrapped module for a DistributedDataParallel model
+    """
     start_time = time.time()
-    best_model_wts = copy.deepcopy(model.state_dict())
+    distributed = isinstance(model, DistributedDataParallel)
+    # State dicts come from the wrapped module so their keys have no 'module.' prefix
+    module = model.module if distributed else model
+    # Best weights live in CPU buffers allocated once and overwritten in place on
+    # every improvement, rather than a fresh deep copy of the state dict each time
+    best_model_wts = {name: tensor.detach().to('cpu', copy=True) for name, tensor in module.state_dict().items()}
     best_acc = 0.0
+    start_epoch = 0
+
+    # bfloat16 keeps float32's exponent range, so only float16 needs loss scaling
+    amp_dtype = torch.float16 if device.type == 'cuda' else torch.bfloat16
+    scaler = torch.amp.GradScaler('cuda', enabled=amp and device.type == 'cuda')
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    accumulation_steps = max(1, accumulation_steps)
 
-    for epoch in range(num_epochs):
-        print(f'Epoch {epoch}/{num_epochs - 1}')
-        print('-' * 10)
+    if resume:
+        start_epoch, best_acc = load_training_state(resume, module, optimizer, scaler, best_model_wts)
+        log(f"Resumed from '{resume}' after epoch {start_epoch - 1} (best accuracy so far {best_acc:.4f})")
+
+    for epoch in range(start_epoch, num_epochs):
+        log(f'Epoch {epoch}/{num_epochs - 1}')
+        log('-' * 10)
 
         for phase in ['train', 'val']:
             if phase == 'train':
@@ -89,39 +385,94 @@ def train_model(model, criterion, optimizer, dataloaders, dataset_sizes, device,
 
             running_loss = 0.0
             running_corrects = 0
+            running_count = 0
+
+            # A new shuffle of the shards every epoch
+            sampler = getattr(dataloaders[phase], 'sampler', None)
+            if hasattr(sampler, 'set_epoch'):
+                sampler.set_epoch(epoch)
+
+            # Time spent blocked on the DataLoader vs. running the step
+            data_time = 0.0
+            compute_time = 0.0
+            step_end = time.perf_counter()
+
+            num_batches = len(dataloaders[phase])
+
+            for step, (inputs, labels) in enumerate(dataloaders[phase]):
+                step_start = time.perf_counter()
+                data_time += step_start - step_end
 
-            for inputs, labels in dataloaders[phase]:
-                inputs = inputs.to(device)
-                labels = labels.to(device)
-                optimizer.zero_grad()
+                inputs = inputs.to(device, non_blocking=True, memory_format=memory_format)
+                labels = labels.to(device, non_blocking=True)
+
+                # Gradients build up over a window of accumulation_steps batches;
+                # the last window of the epoch may be shorter
+                window_start = step - step % accumulation_steps
+                window = min(accumulation_steps, num_batches - window_start)
+                if phase == 'train' and step == window_start:
+                    optimizer.zero_grad(set_to_none=True)
 
                 with torch.set_grad_enabled(phase == 'train'):
-                    outputs = model(inputs)
+                    with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=amp):
+                        outputs = model(inputs)
+                        if teacher is not None and phase == 'train':
+                            with torch.no_grad():
+                                teacher_outputs = teacher(inputs)
+                    # Losses in float32 whatever precision the forward pass ran in
+                    outputs = outputs.float()
                     _, preds = torch.max(outputs, 1)
-                    loss = criterion(outputs, labels)
+                    if teacher is not None and phase == 'train':
+                        loss = distillation_loss(outputs, teacher_outputs.float(), labels, temperature, alpha)
+                    else:
+                        loss = criterion(outputs, labels)
 
                     if phase == 'train':
-                        loss.backward()
-                        optimizer.step()
+                        last_in_window = step + 1 == window_start + window
+                        # Only the last batch of a window needs its gradients all-reduced
+                        sync = model.no_sync() if distributed and not last_in_window else contextlib.nullcontext()
+                        with sync:
+                            scaler.scale(loss / window).backward()
+                        if last_in_window:
+                            scaler.step(optimizer)
+                            scaler.update()
 
+                # loss.item() waits for the device, so the step is finished here
                 running_loss += loss.item() * inputs.size(0)
-                running_corrects += torch.sum(preds == labels.data)
+                running_corrects += torch.sum(preds == labels.data).item()
+                running_count += inputs.size(0)
+
+                step_end = time.perf_counter()
+                compute_time += step_end - step_start
 
-            epoch_loss = running_loss / dataset_sizes[phase]
-            epoch_acc = running_corrects.double() / dataset_sizes[phase]
-            print(f'{phase.capitalize()} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
+            totals = torch.tensor([running_loss, running_corrects, running_count], dtype=torch.float64)
+            if distributed:
+                dist.all_reduce(totals)
+            running_loss, running_corrects, running_count = totals.tolist()
+
+            epoch_loss = running_loss / running_count
+            epoch_acc = running_corrects / running_count
+            phase_time = data_time + compute_time
+            log(f'{phase.capitalize()} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
+            log(f'  Data wait: {data_time:.1f}s ({data_time / phase_time * 100:.0f}%), '
+                f'compute: {compute_time:.1f}s, {running_count / phase_time:.1f} images/s')
 
             if phase == 'val' and epoch_acc > best_acc:
                 best_acc = epoch_acc
-                best_model_wts = copy.deepcopy(model.state_dict())
-        print()
+                for name, tensor in module.state_dict().items():
+                    best_model_wts[name].copy_(tensor)
+
+        if checkpoint_path and is_main_process() and ((epoch + 1) % checkpoint_every == 0 or epoch + 1 == num_epochs):
+            save_training_state(checkpoint_path, epoch + 1, module, optimizer, scaler, best_model_wts, best_acc)
+            log(f'Saved training state to {checkpoint_path}')
+        log()
 
     time_elapsed = time.time() - start_time
-    print(f'Training complete in {time_elapsed // 60:.0f}m {time_elapsed % 60:.0f}s')
-    print(f'Best Validation Accuracy: {best_acc:.4f}')
+    log(f'Training complete in {time_elapsed // 60:.0f}m {time_elapsed % 60:.0f}s')
+    log(f'Best Validation Accuracy: {best_acc:.4f}')
 
-    model.load_state_dict(best_model_wts)
-    return model
+    module.load_state_dict(best_model_wts)
+    return module, best_acc
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
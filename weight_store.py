@@ -0,0 +1,122 @@
+"""
+Memory-mapped weight files for the EcoSage model server
+Weights are stored as raw, aligned tensor data after a small JSON header. The
+loader maps the file read-only and builds tensors directly on top of the
+mapping, so every server process on a node shares the same physical pages
+instead of holding a private copy of the model
+"""
+
+import json
+import mmap
+import struct
+import warnings
+
+import numpy as np
+
+WEIGHTS_MAGIC = b'ECOW0001'
+ALIGNMENT = 64
+
+# torch dtype name -> (numpy storage dtype, torch view dtype or None)
+_DTYPES = {
+    'float32': ('<f4', None),
+    'float16': ('<f2', None),
+    'bfloat16': ('<u2', 'bfloat16'),
+    'float64': ('<f8', None),
+    'int64': ('<i8', None),
+    'int32': ('<i4', None),
+    'int8': ('i1', None),
+    'uint8': ('u1', None),
+    'bool': ('?', None)
+}
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_weights(state_dict, path, metadata=None, channels_last=False):
+    """
+    Write a state dict as a single memory-mappable file
+
+    Layout: magic (8 bytes) | header length (uint64) | JSON header | aligned tensor data
+
+    Args:
+        state_dict (dict): Tensors to store
+        path (str): Output file
+        metadata (dict): Classes, preprocessing and provenance details
+        channels_last (bool): Store 4D weights in NHWC order so the loaded
+            tensors are already channels_last without a copy
+    """
+    import torch
+
+    tensors = {}
+    blobs = []
+    offset = 0
+    for name, tensor in state_dict.items():
+        tensor = tensor.detach().cpu()
+        layout = 'channels_last' if channels_last and tensor.dim() == 4 else 'contiguous'
+        shape = list(tensor.shape)
+        tensor = tensor.permute(0, 2, 3, 1).contiguous() if layout == 'channels_last' else tensor.contiguous()
+        dtype = str(tensor.dtype).replace('torch.', '')
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype} for {name}")
+        if dtype == 'bfloat16':
+            data = tensor.view(torch.int16).numpy().tobytes()
+        else:
+            data = tensor.numpy().tobytes()
+
+        offset = _align(offset)
+        tensors[name] = {"dtype": dtype, "shape": shape, "layout": layout, "offset": offset, "nbytes": len(data)}
+        blobs.append((offset, data))
+        offset += len(data)
+
+    header = json.dumps({"tensors": tensors, "metadata": metadata or {}}).encode('utf-8')
+    data_start = _align(len(WEIGHTS_MAGIC) + 8 + len(header))
+
+    with open(path, 'wb') as f:
+        f.write(WEIGHTS_MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for blob_offset, data in blobs:
+            f.seek(data_start + blob_offset)
+            f.write(data)
+
+
+def load_weights(path):
+    """
+    Map a weight file read-only and return tensors backed by the mapping
+
+    Returns:
+        tuple: (state dict of read-only CPU tensors, metadata dict)
+    """
+    import torch
+
+    with open(path, 'rb') as f:
+        if f.read(len(WEIGHTS_MAGIC)) != WEIGHTS_MAGIC:
+            raise ValueError(f"{path} is not an EcoSage weight file")
+        header_length, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_length))
+        # The mapping stays valid after the file is closed
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    data_start = _align(len(WEIGHTS_MAGIC) + 8 + header_length)
+    state_dict = {}
+    with warnings.catch_warnings():
+        # torch warns that the arrays are not writable; inference never writes them
+        warnings.simplefilter('ignore', UserWarning)
+        for name, info in header["tensors"].items():
+            storage_dtype, view_dtype = _DTYPES[info["dtype"]]
+            count = info["nbytes"] // np.dtype(storage_dtype).itemsize
+            array = np.frombuffer(mapping, dtype=storage_dtype, count=count, offset=data_start + info["offset"])
+            tensor = torch.from_numpy(array)
+            if view_dtype:
+                tensor = tensor.view(getattr(torch, view_dtype))
+            if info.get("layout") == 'channels_last':
+                n, c, h, w = info["shape"]
+                # NHWC bytes viewed as NCHW with channels_last strides
+                tensor = tensor.reshape(n, h, w, c).permute(0, 3, 1, 2)
+            else:
+                tensor = tensor.reshape(info["shape"])
+            state_dict[name] = tensor
+
+    return state_dict, header.get("metadata", {})